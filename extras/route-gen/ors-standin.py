@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIRECTIONS_PATH = "/v2/directions/foot-walking/geojson"
+MATRIX_PATH = "/v2/matrix/foot-walking"
+
+M_PER_DEG = 6371000.0 * math.pi / 180.0
+
+# Synthetic routes: a vertex every STEP_M metres, bowed sideways by this
+# fraction of the straight distance (alternatives bow further, alternately
+# to either side) and walking distances are this much longer than straight
+STEP_M = 10.0
+BOW = 0.08
+DETOUR = 1.3
+
+
+# =============== RECORDED RESPONSES ===============
+
+def canonical(path, body):
+    text = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{path}\n{text}".encode("utf-8")).hexdigest()
+
+
+def load_recordings(cache_dir):
+    """{canonical(path, body): response} from a route-gen .ors-cache folder.
+
+    Entries are matched on the endpoint path only, so responses recorded
+    against the public API replay under any base URL.
+    """
+    recordings = {}
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                path = "/" + entry["url"].split("://", 1)[-1].split("/", 1)[1]
+                recordings[canonical(path, entry["body"])] = entry["response"]
+            except (OSError, ValueError, KeyError, IndexError):
+                continue
+    return recordings
+
+
+# =============== SYNTHETIC RESPONSES ===============
+
+def distance_m(a, b):
+    """Planar distance (m) between two [lon, lat] points, fine at city scale."""
+    kx = M_PER_DEG * math.cos(math.radians((a[1] + b[1]) / 2))
+    return math.hypot((b[0] - a[0]) * kx, (b[1] - a[1]) * M_PER_DEG)
+
+
+def synthetic_route(a, b, bow, rnd):
+    """Quadratic curve from a to b bowed sideways by bow x the distance."""
+    length = distance_m(a, b)
+    count = max(2, int(length * (1 + abs(bow)) / STEP_M) + 1)
+    mid = ((a[0] + b[0]) / 2 - (b[1] - a[1]) * bow, (a[1] + b[1]) / 2 + (b[0] - a[0]) * bow)
+    jitter = 1.0 / M_PER_DEG
+    coords = []
+    for i in range(count):
+        t = i / (count - 1)
+        lon = (1 - t) ** 2 * a[0] + 2 * (1 - t) * t * mid[0] + t ** 2 * b[0]
+        lat = (1 - t) ** 2 * a[1] + 2 * (1 - t) * t * mid[1] + t ** 2 * b[1]
+        if 0 < i < count - 1:
+            lon += rnd.gauss(0, jitter)
+            lat += rnd.gauss(0, jitter)
+        coords.append([round(lon, 6), round(lat, 6)])
+    return coords
+
+
+def synthetic_directions(body, max_alternatives):
+    a, b = body["coordinates"][0], body["coordinates"][-1]
+    count = 1 + min(
+        max_alternatives,
+        max(0, body.get("alternative_routes", {}).get("target_count", 1) - 1),
+    )
+    rnd = random.Random(canonical(DIRECTIONS_PATH, body))
+    features = []
+    for k in range(count):
+        side = 1 if k % 2 else -1
+        bow = BOW * (1 + k) * side if k else BOW * 0.25
+        coords = synthetic_route(a, b, bow, rnd)
+        length = sum(distance_m(p, q) for p, q in zip(coords, coords[1:]))
+        features.append({
+            "type": "Feature",
+            "properties": {"summary": {"distance": round(length, 1)}},
+            "geometry": {"type": "LineString", "coordinates": coords},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def synthetic_matrix(body):
+    locations = body["locations"]
+    sources = body.get("sources") or range(len(locations))
+    destinations = body.get("destinations") or range(len(locations))
+    return {
+        "distances": [
+            [round(distance_m(locations[i], locations[j]) * DETOUR, 2) for j in destinations]
+            for i in sources
+        ],
+    }
+
+
+# =============== SERVER ===============
+
+class StandIn:
+    """Answers ORS directions and matrix requests from recordings or synthesis,
+    after a random delay and with injected failures."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503,
+                 max_alternatives=2, recordings=None, replay_only=False, seed=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_alternatives = max_alternatives
+        self.recordings = recordings or {}
+        self.replay_only = replay_only
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "replayed": 0, "synthetic": 0, "errors": 0, "misses": 0}
+
+    def answer(self, path, body):
+        """(status, payload) for one request."""
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = max(0.0, self.rnd.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+            fail = self.rnd.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            self.count("errors")
+            return self.error_status, {"error": {"code": 0, "message": "stand-in injected error"}}
+
+        recorded = self.recordings.get(canonical(path, body))
+        if recorded is not None:
+            self.count("replayed")
+            return 200, recorded
+        if self.replay_only or path not in (DIRECTIONS_PATH, MATRIX_PATH):
+            self.count("misses")
+            return 404, {"error": {"code": 2010, "message": f"no recording for {path}"}}
+
+        self.count("synthetic")
+        if path == DIRECTIONS_PATH:
+            return 200, synthetic_directions(body, self.max_alternatives)
+        return 200, synthetic_matrix(body)
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def make_handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self.reply(400, {"error": {"code": 2000, "message": "invalid JSON body"}})
+                return
+            self.reply(*standin.answer(self.path.split("?", 1)[0], body))
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with standin.lock:
+                    self.reply(200, dict(standin.stats))
+            else:
+                self.reply(404, {"error": {"code": 0, "message": "not found"}})
+
+        def reply(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(standin, host="127.0.0.1", port=0):
+    """Serve standin on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+# =============== MAIN LOGIC ===============
+
+def add_standin_args(parser):
+    parser.add_argument(
+        "--latency-ms", type=float, default=0.0,
+        help="mean delay before every reply (default: 0)",
+    )
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0.0,
+        help="standard deviation of the delay (default: 0)",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0,
+        help="fraction of requests that fail with --error-status (default: 0)",
+    )
+    parser.add_argument(
+        "--error-status", type=int, default=503,
+        help="HTTP status of injected failures (default: 503)",
+    )
+    parser.add_argument(
+        "--alternatives", type=int, default=2,
+        help="most alternative routes a synthetic reply holds (default: 2)",
+    )
+    parser.add_argument(
+        "--replay",
+        help="route-gen .ors-cache folder whose recorded responses are served first",
+    )
+    parser.add_argument(
+        "--replay-only", action="store_true",
+        help="answer 404 instead of synthesizing when nothing was recorded",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="latency/error generator seed")
+
+
+def standin_from_args(args):
+    recordings = load_recordings(args.replay) if args.replay else {}
+    return StandIn(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        max_alternatives=args.alternatives,
+        recordings=recordings,
+        replay_only=args.replay_only,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Local OpenRouteService stand-in for offline route-gen runs.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_standin_args(parser)
+    args = parser.parse_args(argv)
+
+    standin = standin_from_args(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(standin))
+    server.daemon_threads = True
+    print(
+        f"ORS stand-in on http://{args.host}:{server.server_address[1]} "
+        f"({len(standin.recordings)} recorded responses); "
+        f"use ORS_BASE_URL or route-gen.py --ors-url to point at it"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {json.dumps(standin.stats)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
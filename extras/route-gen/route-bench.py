@@ -0,0 +1,344 @@
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Synthetic networks are laid out in metres around this point
+ORIGIN_LAT, ORIGIN_LON = 52.50500, 6.10700
+
+SHAPES = ("grid", "parallel", "noisy")
+DEFAULT_SIZES = (100, 1000, 10000)
+
+# Tuning constants each stage reads; looked up by name so older route-gen.py
+# versions (without resolve_params) can be benchmarked too
+PARAM_NAMES = (
+    "MERGE_DIST_M",
+    "CONNECT_DIST_M",
+    "COMPONENT_LINK_MAX_DIST",
+    "NEAR_LINE_DIST_M",
+    "SKIP_MAX_EXTRA_RATIO",
+    "SKIP_MAX_PERP_DIST_M",
+)
+
+STAGES = (
+    "json_to_internal",
+    "merge_close_nodes",
+    "connect_close_nodes",
+    "connect_components",
+    "split_edges_by_near_nodes",
+    "prune_skip_edges",
+    "internal_to_json",
+)
+
+
+# =============== LOADING ROUTE-GEN ===============
+
+def load_route_gen(path):
+    # No ORS calls are made here, the key only has to exist for the import
+    os.environ.setdefault("ORS_API_KEY", "offline-benchmark")
+    spec = importlib.util.spec_from_file_location("route_gen", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["route_gen"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============== SYNTHETIC NETWORKS ===============
+
+def m_to_lonlat(x, y):
+    lat = ORIGIN_LAT + y / 111320.0
+    lon = ORIGIN_LON + x / (111320.0 * math.cos(math.radians(ORIGIN_LAT)))
+    return lon, lat
+
+
+def polyline(x0, y0, x1, y1, step_m, rnd=None, noise_m=0.0):
+    length = math.hypot(x1 - x0, y1 - y0)
+    count = max(2, int(length / step_m) + 1)
+    pts = []
+    for i in range(count):
+        t = i / (count - 1)
+        x = x0 + (x1 - x0) * t
+        y = y0 + (y1 - y0) * t
+        if rnd is not None and noise_m:
+            x += rnd.gauss(0, noise_m)
+            y += rnd.gauss(0, noise_m)
+        pts.append(m_to_lonlat(x, y))
+    return pts
+
+
+def gen_grid(n, rnd):
+    """Street lattice, 60 m blocks with a vertex every 15 m."""
+    block_m, step_m = 60.0, 15.0
+    per_line = 0
+    lines = 2
+    while True:
+        side = lines * block_m
+        per_line = int(side / step_m) + 1
+        if 2 * lines * per_line >= n:
+            break
+        lines += 1
+    side = (lines - 1) * block_m
+    routes = []
+    for k in range(lines):
+        c = k * block_m
+        routes.append(polyline(0, c, side, c, step_m, rnd, 0.5))
+        routes.append(polyline(c, 0, c, side, step_m, rnd, 0.5))
+    return routes
+
+
+def gen_parallel(n, rnd):
+    """Long streets with sidewalks 10 m apart and a crossing every 80 m."""
+    length_m, step_m = 800.0, 12.0
+    per_line = int(length_m / step_m) + 1
+    streets = max(1, math.ceil(n / (2 * per_line)))
+    routes = []
+    for s in range(streets):
+        y = s * 45.0
+        routes.append(polyline(0, y, length_m, y, step_m, rnd, 0.8))
+        routes.append(polyline(0, y + 10.0, length_m, y + 10.0, step_m, rnd, 0.8))
+        for x in range(0, int(length_m) + 1, 80):
+            routes.append(polyline(x, y, x, y + 10.0, step_m))
+    return routes
+
+
+def gen_noisy(n, rnd):
+    """Repeated GPS traces of the same random walks, with 3 m jitter."""
+    traces_per_path, step_m = 4, 8.0
+    routes = []
+    total = 0
+    while total < n:
+        x, y = rnd.uniform(0, 1500), rnd.uniform(0, 1500)
+        heading = rnd.uniform(0, 2 * math.pi)
+        path = [(x, y)]
+        for _ in range(60):
+            heading += rnd.gauss(0, 0.25)
+            x += step_m * math.cos(heading)
+            y += step_m * math.sin(heading)
+            path.append((x, y))
+        for _ in range(traces_per_path):
+            routes.append([
+                m_to_lonlat(px + rnd.gauss(0, 3.0), py + rnd.gauss(0, 3.0))
+                for px, py in path
+            ])
+            total += len(path)
+    return routes
+
+
+GENERATORS = {"grid": gen_grid, "parallel": gen_parallel, "noisy": gen_noisy}
+
+
+def make_raw_graph(rg, shape, size, seed):
+    routes = GENERATORS[shape](size, random.Random(f"{shape}-{size}-{seed}"))
+    return rg.build_graph_from_routes(routes)
+
+
+# =============== STAGE RUNNER ===============
+
+def stage_params(rg):
+    return {name.lower(): getattr(rg, name) for name in PARAM_NAMES}
+
+
+def stage_calls(rg, json_nodes, p, state):
+    """One callable per stage, for the CompactGraph pass API or the older
+    (coords, neighbors) one, whichever the loaded route-gen.py has."""
+    if hasattr(rg, "CompactGraph"):
+        def passes(name, *args):
+            fn = getattr(rg, name)
+            return lambda: state.update(graph=fn(state["graph"], *args))
+
+        return {
+            "json_to_internal": lambda: state.update(graph=rg.json_to_internal(json_nodes)),
+            "merge_close_nodes": passes("merge_close_nodes", p["merge_dist_m"]),
+            "connect_close_nodes": passes("connect_close_nodes", p["connect_dist_m"]),
+            "connect_components": passes("connect_components", p["component_link_max_dist"]),
+            "split_edges_by_near_nodes": passes(
+                "split_edges_by_near_nodes", p["near_line_dist_m"]
+            ),
+            "prune_skip_edges": passes(
+                "prune_skip_edges", p["skip_max_extra_ratio"], p["skip_max_perp_dist_m"]
+            ),
+            "internal_to_json": lambda: rg.internal_to_json(state["graph"]),
+        }
+
+    def legacy_merge():
+        state["coords"], state["neighbors"] = rg.merge_close_nodes(
+            state["coords"], state["neighbors"], p["merge_dist_m"]
+        )
+
+    def legacy(name, *args):
+        fn = getattr(rg, name)
+        return lambda: fn(state["coords"], state["neighbors"], *args)
+
+    return {
+        "json_to_internal": lambda: state.update(
+            zip(("coords", "neighbors"), rg.json_to_internal(json_nodes))
+        ),
+        "merge_close_nodes": legacy_merge,
+        "connect_close_nodes": legacy("connect_close_nodes", p["connect_dist_m"]),
+        "connect_components": legacy("connect_components", p["component_link_max_dist"]),
+        "split_edges_by_near_nodes": legacy("split_edges_by_near_nodes", p["near_line_dist_m"]),
+        "prune_skip_edges": legacy(
+            "prune_skip_edges", p["skip_max_extra_ratio"], p["skip_max_perp_dist_m"]
+        ),
+        "internal_to_json": legacy("internal_to_json"),
+    }
+
+
+def run_stages(rg, json_nodes, p, measure_memory):
+    """Run every clean_graph stage in order, timing (or tracing) each one."""
+    state = {}
+    calls = stage_calls(rg, json_nodes, p, state)
+
+    out = {}
+    for name in STAGES:
+        if "graph" in state:
+            nodes_in = len(state["graph"])
+        else:
+            nodes_in = len(state.get("coords", json_nodes))
+        if measure_memory:
+            tracemalloc.start()
+            calls[name]()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            out[name] = {"peak_mem_bytes": peak}
+        else:
+            t0 = time.perf_counter()
+            calls[name]()
+            dt = time.perf_counter() - t0
+            out[name] = {
+                "seconds": dt,
+                "nodes_in": nodes_in,
+                "nodes_per_s": nodes_in / dt if dt > 0 else None,
+            }
+    return out
+
+
+def bench_case(rg, shape, size, seed, params, measure_memory):
+    json_nodes = make_raw_graph(rg, shape, size, seed)
+    edges = sum(len(n["connected_to"]) for n in json_nodes) // 2
+    stages = run_stages(rg, json_nodes, params, measure_memory=False)
+    if measure_memory:
+        # Separate pass: tracemalloc slows allocation-heavy code several-fold
+        for name, mem in run_stages(rg, json_nodes, params, measure_memory=True).items():
+            stages[name].update(mem)
+    return {
+        "shape": shape,
+        "size": size,
+        "raw_nodes": len(json_nodes),
+        "raw_edges": edges,
+        "total_s": sum(s["seconds"] for s in stages.values()),
+        "stages": stages,
+    }
+
+
+# =============== REPORTING ===============
+
+def fmt_bytes(n):
+    if n is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def print_case(case, baseline=None):
+    print(
+        f"{case['shape']:<9} n={case['raw_nodes']:<7} e={case['raw_edges']:<7} "
+        f"total {case['total_s']:.3f} s"
+    )
+    for name in STAGES:
+        st = case["stages"][name]
+        line = (
+            f"    {name:<26} {st['seconds']:9.4f} s  "
+            f"{(st['nodes_per_s'] or 0):>12,.0f} nodes/s  "
+            f"peak {fmt_bytes(st.get('peak_mem_bytes')):>9}"
+        )
+        if baseline is not None:
+            old = baseline["stages"].get(name, {}).get("seconds")
+            if old:
+                line += f"  x{old / st['seconds']:.2f} vs baseline" if st["seconds"] else ""
+        print(line)
+
+
+def find_baseline_case(baseline, case):
+    if baseline is None:
+        return None
+    for old in baseline.get("results", []):
+        if old["shape"] == case["shape"] and old["size"] == case["size"]:
+            return old
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time every clean_graph stage on synthetic route networks (offline).",
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+        help="approximate raw node counts to generate (default: 100 1000 10000)",
+    )
+    parser.add_argument(
+        "--shapes", nargs="+", choices=SHAPES, default=list(SHAPES),
+        help="network shapes to generate (default: all)",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="generator seed")
+    parser.add_argument(
+        "--no-memory", action="store_true",
+        help="skip the tracemalloc pass that records peak memory per stage",
+    )
+    parser.add_argument(
+        "--route-gen", default=os.path.join(HERE, "route-gen.py"),
+        help="route-gen.py to benchmark, e.g. an older checkout",
+    )
+    parser.add_argument(
+        "--out", default="bench-results.json",
+        help="where to save the JSON results (default: bench-results.json)",
+    )
+    parser.add_argument(
+        "--compare",
+        help="earlier results JSON to print per-stage speedups against",
+    )
+    args = parser.parse_args(argv)
+
+    rg = load_route_gen(args.route_gen)
+    params = stage_params(rg)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            case = bench_case(rg, shape, size, args.seed, params, not args.no_memory)
+            results.append(case)
+            print_case(case, find_baseline_case(baseline, case))
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "route_gen": os.path.abspath(args.route_gen),
+            "python": platform.python_version(),
+            "numpy": getattr(getattr(rg, "np", None), "__version__", None),
+            "machine": platform.machine(),
+            "seed": args.seed,
+            "params": params,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,46 @@
+import argparse
+import codecs
+import cProfile
+import csv
+import hashlib
+import io
 import json
 import math
 import os
+import heapq
+import pstats
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import product
 from typing import List, Tuple
-from collections import deque
 
 import requests
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:  # batch kernels fall back to pure Python
+    np = None
+
 # =============== ENV / CONFIG ===============
 
-# Load .env from current folder (expects ORS_API_KEY there)
+# Load .env from current folder (ORS_API_KEY, optionally ORS_BASE_URL)
 load_dotenv()
-ORS_API_KEY = os.getenv("ORS_API_KEY", "").strip()
-if not ORS_API_KEY:
-    raise RuntimeError("ORS_API_KEY not found in .env")
+ORS_PUBLIC_URL = "https://api.openrouteservice.org"
+ORS_BASE_URL = (os.getenv("ORS_BASE_URL", "").strip() or ORS_PUBLIC_URL).rstrip("/")
+ORS_API_KEY = os.getenv("ORS_API_KEY", "").strip()   # only the public API needs one
 
 # Start and end coordinates (example: barracks -> shop)
 START_LAT, START_LON = 52.50479, 6.11230
@@ -25,12 +52,18 @@ ALT_ROUTE_COUNT = 0   # 0, 1, or 2
 # How many ladder connectors per alt route along the main route
 CONNECTORS_PER_ALT = 3
 
+# Choose connectors by walking distance from one ORS matrix request over
+# CONNECTOR_CANDIDATE_FACTOR x as many candidate points (see CONNECTOR
+# PLANNING); False = fixed main-route points to the closest alt point
+CONNECTOR_MATRIX           = True
+CONNECTOR_CANDIDATE_FACTOR = 3
+
 # Max distance (m) to connect main <-> alt routes
 MAX_CONNECTOR_DIST_M = 400.0
 
 # Simplification thresholds for ORS polylines
-ANGLE_THRESHOLD_DEG = 15.0   # keep points where turn angle ≥ this
-MAX_SEGMENT_DIST_M  = 60.0   # also keep points at least every X m on straights
+SIMPLIFY_TOLERANCE_M = 5.0    # max distance (m) of any dropped point from the kept line
+MAX_SEGMENT_DIST_M   = 60.0   # also keep points at least every X m on straights
 
 # Graph cleaning parameters
 MERGE_DIST_M             = 4.0     # merge nodes closer than this
@@ -44,10 +77,237 @@ SKIP_MAX_PERP_DIST_M     = 5.0     # path must stay within 5 m of straight line
 JSON_PATH = "route.json"
 KML_PATH  = "route.kml"
 
+# Compact binary graph (see BINARY GRAPH FORMAT), written next to route.json
+WRITE_GRAPH_BIN = False
+
+# Per-node next hop toward the destination, remaining distance and edge
+# lengths/bearings in route.json (see ordered_to_json)
+EMBED_NAV_TABLE = True
+
+# Per-node grid cell in route.json for fast nearest-node lookups (see SNAP INDEX)
+EMBED_SNAP_INDEX = True
+
+# KML output
+KML_COALESCE_CHAINS = True    # one LineString per run of degree-2 nodes instead of per edge
+KMZ_OUTPUT          = False   # write zipped .kmz instead of plain .kml
+
+# ORS response cache, keyed by endpoint + canonical request body
+ORS_CACHE_DIR       = ".ors-cache"
+ORS_CACHE_TTL_S     = 30 * 24 * 3600     # refetch entries older than this (None = never)
+ORS_CACHE_MAX_BYTES = 64 * 1024 * 1024   # evict least recently used entries beyond this
+ORS_CACHE_ONLY      = False              # never call ORS, fail on cache miss
+ORS_CACHE_ENABLED   = True
+
+# Checkpoints of every clean_graph stage, so reruns with changed cleaning
+# parameters start at the first stage those parameters affect
+STAGE_CACHE_DIR       = ".stage-cache"
+STAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024   # evict least recently used checkpoints beyond this
+STAGE_CACHE_ENABLED   = True
+
+# Tiled clean_graph (see TILED CLEANING): worker processes and tile side (m)
+CLEAN_JOBS   = 1       # 1 = run every pass serially over the whole graph
+CLEAN_TILE_M = 300.0
+
+# Local walking network (GeoJSON LineStrings) that answers connector
+# queries instead of ORS, see LOCAL ROUTER; None = always ask ORS
+LOCAL_NETWORK_PATH    = None
+LOCAL_ROUTE_BASE      = False   # also route the base path locally (no alternatives)
+LOCAL_SNAP_MAX_DIST_M = 50.0    # query points further than this from the network get no route
+LOCAL_DENSIFY_M       = 25.0    # split network segments longer than this when loading
+
+# Connector fetching: parallel ORS requests over one keep-alive session
+ORS_MAX_WORKERS          = 4      # concurrent in-flight requests
+ORS_MAX_REQUESTS_PER_MIN = 40     # ORS free tier allows 40 directions/min (None = no limit)
+
+
+# =============== PIPELINE PARAMETERS ===============
+
+def default_params():
+    """Tunable pipeline settings, seeded from the config constants above."""
+    return {
+        "alt_route_count": ALT_ROUTE_COUNT,
+        "connectors_per_alt": CONNECTORS_PER_ALT,
+        "connector_candidate_factor": CONNECTOR_CANDIDATE_FACTOR,
+        "max_connector_dist_m": MAX_CONNECTOR_DIST_M,
+        "simplify_tolerance_m": SIMPLIFY_TOLERANCE_M,
+        "max_segment_dist_m": MAX_SEGMENT_DIST_M,
+        "merge_dist_m": MERGE_DIST_M,
+        "connect_dist_m": CONNECT_DIST_M,
+        "component_link_max_dist": COMPONENT_LINK_MAX_DIST,
+        "near_line_dist_m": NEAR_LINE_DIST_M,
+        "skip_max_extra_ratio": SKIP_MAX_EXTRA_RATIO,
+        "skip_max_perp_dist_m": SKIP_MAX_PERP_DIST_M,
+    }
+
+
+def resolve_params(overrides=None):
+    """Defaults with overrides applied; keys are lower-cased constant names."""
+    params = default_params()
+    for key, value in (overrides or {}).items():
+        key = key.lower()
+        if key not in params:
+            raise ValueError(f"Unknown route parameter: {key}")
+        params[key] = _coerce_param(key, value, type(params[key]))
+    return params
+
+
+def _coerce_param(key, value, kind):
+    """value as kind; ints accept any integral number, e.g. "1.0" from a CSV."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or (kind is int and not number.is_integer()):
+        raise ValueError(f"Bad value for route parameter {key}: {value!r}")
+    return kind(number)
+
+
+# =============== INSTRUMENTATION ===============
+
+# Off by default; the hot paths only pay for one global bool check
+PROFILING = False
+PROFILE_COUNTERS = Counter()
+PROFILE_STAGES = {}
+PROFILE_PASSES = []
+PROFILE_HISTOGRAMS = {}
+_PROFILE_STACK = []
+_PROFILE_LOCK = threading.Lock()
+
+
+def profiling_start(trace_memory=True):
+    """Reset all counters and start recording stages (and peak memory)."""
+    global PROFILING
+    PROFILE_COUNTERS.clear()
+    PROFILE_STAGES.clear()
+    PROFILE_PASSES.clear()
+    PROFILE_HISTOGRAMS.clear()
+    _PROFILE_STACK.clear()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    PROFILING = True
+
+
+def profiling_stop():
+    global PROFILING
+    PROFILING = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def profile_count(name, n=1):
+    if PROFILING:
+        with _PROFILE_LOCK:
+            PROFILE_COUNTERS[name] += n
+
+
+def profile_histogram(name, value):
+    if PROFILING:
+        hist = PROFILE_HISTOGRAMS.setdefault(name, Counter())
+        hist[value] += 1
+
+
+@contextmanager
+def profile_stage(name):
+    """Accumulate wall time and peak traced memory under a stage name.
+
+    Stages may nest (e.g. simplify_route inside a fetch); an inner stage's
+    peak is folded into its parent so tracemalloc.reset_peak() stays safe.
+    """
+    if not PROFILING:
+        yield
+        return
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if _PROFILE_STACK:
+            parent = _PROFILE_STACK[-1]
+            parent[1] = max(parent[1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    frame = [name, 0]
+    _PROFILE_STACK.append(frame)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - t0
+        _PROFILE_STACK.pop()
+        peak = max(frame[1], tracemalloc.get_traced_memory()[1]) if tracing else None
+        if _PROFILE_STACK and peak is not None:
+            _PROFILE_STACK[-1][1] = max(_PROFILE_STACK[-1][1], peak)
+        st = PROFILE_STAGES.setdefault(
+            name, {"calls": 0, "wall_s": 0.0, "peak_mem_bytes": None}
+        )
+        st["calls"] += 1
+        st["wall_s"] += wall
+        if peak is not None:
+            st["peak_mem_bytes"] = max(st["peak_mem_bytes"] or 0, peak)
+
+
+def _edge_keys(graph):
+    """Edges of a CompactGraph keyed by endpoint coordinates, so graphs
+    renumbered by a pass can still be compared."""
+    lat, lon = graph.lat, graph.lon
+    keys = set()
+    for u, v in zip(*graph.edge_arrays()):
+        a, b = (lat[u], lon[u]), (lat[v], lon[v])
+        keys.add((a, b) if a <= b else (b, a))
+    return keys
+
+
+def run_pass(name, fn, graph, *args):
+    """Run one cleaning pass as a profiled stage, logging graph size changes.
+
+    Passes take a CompactGraph and return the (possibly new) graph. Edges
+    are matched by endpoint coordinates, so an edge whose end a pass moves
+    counts as removed and added again.
+    """
+    if not PROFILING:
+        return fn(graph, *args)
+
+    nodes_in, edges_in = len(graph), graph.edge_count()
+    keys_in = _edge_keys(graph)
+    with profile_stage(name):
+        out = fn(graph, *args)
+    nodes_out, edges_out = len(out), out.edge_count()
+    keys_out = _edge_keys(out)
+    PROFILE_PASSES.append({
+        "name": name,
+        "nodes_in": nodes_in,
+        "nodes_out": nodes_out,
+        "edges_in": edges_in,
+        "edges_out": edges_out,
+        "edges_added": len(keys_out - keys_in),
+        "edges_removed": len(keys_in - keys_out),
+    })
+    return out
+
+
+def profiling_report(extra=None):
+    """Everything recorded since profiling_start(), as JSON-ready data."""
+    report = {
+        "stages": {name: dict(st) for name, st in PROFILE_STAGES.items()},
+        "passes": list(PROFILE_PASSES),
+        "counters": dict(PROFILE_COUNTERS),
+        "histograms": {
+            name: {str(k): v for k, v in sorted(hist.items())}
+            for name, hist in PROFILE_HISTOGRAMS.items()
+        },
+    }
+    if extra:
+        report.update(extra)
+    return report
+
+
+def write_profiling_report(path, extra=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profiling_report(extra), f, indent=2)
+
 
 # =============== GEOMETRY HELPERS ===============
 
 def haversine_m(lat1, lon1, lat2, lon2) -> float:
+    if PROFILING:
+        PROFILE_COUNTERS["haversine_m_calls"] += 1
     R = 6371000.0
     dlat = math.radians(lat2 - lat1)
     dlon = math.radians(lon2 - lon1)
@@ -61,50 +321,697 @@ def haversine_m(lat1, lon1, lat2, lon2) -> float:
     return R * c
 
 
+# =============== BATCH DISTANCE KERNELS ===============
+
+# Below this many distances per call the scalar loop beats NumPy's call overhead
+NUMPY_MIN_BATCH = 32
+
+
+def _np_haversine(lat1, lon1, lat2, lon2):
+    if PROFILING:
+        PROFILE_COUNTERS["haversine_batch_calls"] += 1
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlon = np.radians(lon2) - np.radians(lon1)
+    a = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    )
+    return 6371000.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def coord_arrays(coords):
+    """Split (lat, lon) pairs into lat and lon arrays (lists without NumPy)."""
+    lats = [c[0] for c in coords]
+    lons = [c[1] for c in coords]
+    if np is not None:
+        return np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    return lats, lons
+
+
+def haversine_pairs(lats1, lons1, lats2, lons2):
+    """Element-wise distances (m) between two equally long coordinate arrays."""
+    if np is None or len(lats1) < NUMPY_MIN_BATCH:
+        return [
+            haversine_m(a, b, c, d)
+            for a, b, c, d in zip(lats1, lons1, lats2, lons2)
+        ]
+    return _np_haversine(
+        np.asarray(lats1, dtype=float),
+        np.asarray(lons1, dtype=float),
+        np.asarray(lats2, dtype=float),
+        np.asarray(lons2, dtype=float),
+    )
+
+
+def haversine_many(lat, lon, lats, lons):
+    """Distances (m) from one point to every point of a coordinate array."""
+    if np is None or len(lats) < NUMPY_MIN_BATCH:
+        return [haversine_m(lat, lon, lat2, lon2) for lat2, lon2 in zip(lats, lons)]
+    return _np_haversine(
+        lat, lon, np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    )
+
+
+def haversine_matrix(lats1, lons1, lats2, lons2):
+    """Distance matrix (m), one row per point of the first array."""
+    if np is None or len(lats1) * len(lats2) < NUMPY_MIN_BATCH:
+        return [haversine_many(lat, lon, lats2, lons2) for lat, lon in zip(lats1, lons1)]
+    lats1 = np.asarray(lats1, dtype=float)[:, None]
+    lons1 = np.asarray(lons1, dtype=float)[:, None]
+    return _np_haversine(
+        lats1, lons1, np.asarray(lats2, dtype=float), np.asarray(lons2, dtype=float)
+    )
+
+
+def nearest_index(lat, lon, lats, lons):
+    """Return (index, dist) of the point closest to (lat, lon), first one on ties."""
+    if len(lats) == 0:
+        return None, float("inf")
+    dists = haversine_many(lat, lon, lats, lons)
+    if isinstance(dists, list):
+        best = min(range(len(dists)), key=dists.__getitem__)
+        return best, dists[best]
+    best = int(dists.argmin())
+    return best, float(dists[best])
+
+
+# =============== SPATIAL INDEX ===============
+
+M_PER_DEG = 6371000.0 * math.pi / 180.0   # arc length of one degree on the haversine sphere
+
+
+class LocalProjection:
+    """Equirectangular projection to metres about a reference point.
+
+    x = (lon - lon0) * cos(lat0) * M_PER_DEG, y = (lat - lat0) * M_PER_DEG.
+    Planar distances then differ from haversine by a relative error of
+    about tan|lat0| * dlat + dlat^2 / 2 (dlat in radians, the latitude
+    offset from lat0), i.e. under 0.05% for a site within 2 km of lat0 at
+    52.5 N; error_bound() gives the figure for a concrete set of points.
+    """
+
+    __slots__ = ("lat0", "lon0", "kx", "ky")
+
+    def __init__(self, lat0, lon0):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.kx = M_PER_DEG * math.cos(math.radians(lat0))
+        self.ky = M_PER_DEG
+
+    @classmethod
+    def around(cls, lats, lons):
+        """Projection centred on the midpoint of the points' bounding box."""
+        if not len(lats):
+            return cls(0.0, 0.0)
+        return cls((min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+
+    def forward(self, lats, lons):
+        """Project lat/lon sequences to array('d') x and y columns in metres."""
+        if np is not None and len(lats) >= NUMPY_MIN_BATCH:
+            xs = (np.asarray(lons, dtype=float) - self.lon0) * self.kx
+            ys = (np.asarray(lats, dtype=float) - self.lat0) * self.ky
+            return array("d", xs.tobytes()), array("d", ys.tobytes())
+        return (
+            array("d", ((lon - self.lon0) * self.kx for lon in lons)),
+            array("d", ((lat - self.lat0) * self.ky for lat in lats)),
+        )
+
+    def error_bound(self, lats):
+        """Worst relative planar-vs-haversine distance error for points at lats."""
+        if not len(lats):
+            return 0.0
+        dlat = math.radians(max(abs(lat - self.lat0) for lat in lats))
+        return abs(math.tan(math.radians(self.lat0))) * dlat + dlat * dlat / 2
+
+
+def build_grid_index(xs, ys, cell_m):
+    """Bucket planar points (metres) into a uniform grid of cell_m squares."""
+    cell_m = max(cell_m, 1e-3)
+    cells = {}
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        key = (math.floor(x / cell_m), math.floor(y / cell_m))
+        cells.setdefault(key, []).append(i)
+    return {"cell_m": cell_m, "cells": cells}
+
+
+def grid_query(index, x, y, radius_m):
+    """Yield indices of all points whose cell may hold a point within radius_m."""
+    cell_m = index["cell_m"]
+    reach = max(1, math.ceil(radius_m / cell_m))
+    ci = math.floor(x / cell_m)
+    cj = math.floor(y / cell_m)
+    cells = index["cells"]
+    for di in range(-reach, reach + 1):
+        for dj in range(-reach, reach + 1):
+            bucket = cells.get((ci + di, cj + dj))
+            if bucket:
+                yield from bucket
+
+
+def grid_query_box(index, x_min, x_max, y_min, y_max):
+    """Yield indices of all points in cells overlapping an x/y box."""
+    cell_m = index["cell_m"]
+    cells = index["cells"]
+    for ci in range(math.floor(x_min / cell_m), math.floor(x_max / cell_m) + 1):
+        for cj in range(math.floor(y_min / cell_m), math.floor(y_max / cell_m) + 1):
+            bucket = cells.get((ci, cj))
+            if bucket:
+                yield from bucket
+
+
+def close_pairs(xs, ys, radius_m):
+    """Yield every (i, j, dist) with i < j and planar dist <= radius_m.
+
+    Pairs come out in (i, j) order, the same order as a plain double loop.
+    """
+    index = build_grid_index(xs, ys, radius_m)
+    r2 = radius_m * radius_m
+    for i, (x1, y1) in enumerate(zip(xs, ys)):
+        hits = []
+        for j in grid_query(index, x1, y1, radius_m):
+            if j <= i:
+                continue
+            dx, dy = xs[j] - x1, ys[j] - y1
+            d2 = dx * dx + dy * dy
+            if d2 <= r2:
+                hits.append((j, d2))
+        hits.sort()
+        for j, d2 in hits:
+            yield i, j, math.sqrt(d2)
+
+
+def _segment_deviation(xs, ys, i, j):
+    """(max distance in metres from points i+1..j-1 to segment i-j, its index)."""
+    x0, y0 = xs[i], ys[i]
+    dx, dy = xs[j] - x0, ys[j] - y0
+    len2 = dx * dx + dy * dy
+    if not isinstance(xs, list):
+        px = xs[i + 1:j] - x0
+        py = ys[i + 1:j] - y0
+        t = np.clip((px * dx + py * dy) / len2, 0.0, 1.0) if len2 else 0.0
+        d = np.hypot(px - t * dx, py - t * dy)
+        k = int(np.argmax(d))
+        return float(d[k]), i + 1 + k
+    best, best_k = -1.0, i + 1
+    for k in range(i + 1, j):
+        px, py = xs[k] - x0, ys[k] - y0
+        t = max(0.0, min(1.0, (px * dx + py * dy) / len2)) if len2 else 0.0
+        d = math.hypot(px - t * dx, py - t * dy)
+        if d > best:
+            best, best_k = d, k
+    return best, best_k
+
+
+def _first_beyond(xs, ys, i, j, dist2):
+    """First index in i+1..j-1 at squared distance >= dist2 from point i, or None."""
+    if not isinstance(xs, list):
+        far = np.flatnonzero(
+            (xs[i + 1:j] - xs[i]) ** 2 + (ys[i + 1:j] - ys[i]) ** 2 >= dist2
+        )
+        return i + 1 + int(far[0]) if len(far) else None
+    for k in range(i + 1, j):
+        dx, dy = xs[k] - xs[i], ys[k] - ys[i]
+        if dx * dx + dy * dy >= dist2:
+            return k
+    return None
+
+
 def simplify_route(
     coords: List[Tuple[float, float]],
-    angle_threshold_deg: float,
+    tolerance_m: float,
     max_segment_dist_m: float,
 ) -> List[Tuple[float, float]]:
-    if len(coords) <= 2:
+    """Reduce (lon, lat) points to a polyline within tolerance_m, in local metres.
+
+    Walks forward from each kept point to the first point max_segment_dist_m
+    away (so the app still gets a waypoint about that often) and keeps it
+    if no point in between lies more than tolerance_m from the chord.
+    Otherwise it binary-searches back for a chord that is within tolerance.
+    Unlike Douglas-Peucker this never keeps both a deviation point and a
+    spacing point close together, so gentle curves keep no more points
+    than the spacing alone asks for.
+    Points are projected equirectangularly about the first one, which is
+    well under 0.1% off at the few-kilometre scale of a route.
+    """
+    n = len(coords)
+    if n <= 2:
         return coords[:]
 
-    simplified = [coords[0]]
-    last_kept = coords[0]
+    proj = LocalProjection(coords[0][1], coords[0][0])
+    xs, ys = proj.forward([c[1] for c in coords], [c[0] for c in coords])
+    if np is not None and n >= NUMPY_MIN_BATCH:
+        xs, ys = np.frombuffer(xs, dtype=float), np.frombuffer(ys, dtype=float)
+    else:
+        xs, ys = list(xs), list(ys)
+
+    max_seg2 = max_segment_dist_m * max_segment_dist_m
+    kept = [0]
+    i = 0
+    while i < n - 1:
+        j = _first_beyond(xs, ys, i, n - 1, max_seg2)
+        if j is None:
+            j = n - 1
+        if j - i >= 2 and _segment_deviation(xs, ys, i, j)[0] > tolerance_m:
+            # i + 1 is always within tolerance (no points in between)
+            lo, hi = i + 1, j
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _segment_deviation(xs, ys, i, mid)[0] <= tolerance_m:
+                    lo = mid
+                else:
+                    hi = mid
+            j = lo
+        kept.append(j)
+        i = j
+
+    return [(coords[k][0], coords[k][1]) for k in kept]
+
+
+# =============== STREAMING JSON ===============
+# Large GeoJSON is read one array item (feature or line) at a time, so
+# memory holds the current item and one read chunk rather than the document.
+
+STREAM_CHUNK_BYTES = 1 << 16
+_JSON_SKIP = re.compile(r"[\s,]*")
+_JSON_SPACE = re.compile(r"\s*")
+_JSON_DECODER = json.JSONDecoder()
+
+
+def iter_text_chunks(source, chunk_size=STREAM_CHUNK_BYTES):
+    """Text chunks from a file object (binary or text) or an iterable of
+    bytes/str chunks such as requests' iter_content()."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    read = getattr(source, "read", None)
+    chunks = iter(lambda: read(chunk_size), None) if read else iter(source)
+    for chunk in chunks:
+        if not chunk:
+            if read:
+                break
+            continue
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def seek_json_array(chunks, path=()):
+    """Read from chunks up to the array to stream; returns (buf, pos).
+
+    A top-level array is used as is. Otherwise object members are decoded
+    in turn, descending into the one named by each key of path, until the
+    last key's value turns out to be an array (e.g. ("features",) for a
+    FeatureCollection); pos then points just past its "[". The same name
+    anywhere else in the document never matches. pos is None when there
+    is no such array, and buf then holds the whole document.
+    """
+    buf, pos, eof = "", 0, False
+    state, name, depth = "start", None, 0
+    while True:
+        pos = _JSON_SPACE.match(buf, pos).end()
+        step = None
+        if pos < len(buf):
+            c = buf[pos]
+            if state == "start":
+                if c == "[":
+                    return buf, pos + 1
+                if c != "{":
+                    break
+                state, step = "key", pos + 1
+            elif state == "colon":
+                if c != ":":
+                    break
+                state, step = "value", pos + 1
+            elif state == "sep":
+                if c != ",":
+                    break
+                state, step = "key", pos + 1
+            elif state == "key" and c == "}":
+                break
+            elif state == "value" and depth < len(path) and name == path[depth]:
+                last = depth == len(path) - 1
+                if last and c == "[":
+                    return buf, pos + 1
+                if last or c != "{":
+                    break
+                state, depth, step = "key", depth + 1, pos + 1
+            else:
+                # A key or a skipped value; like iter_json_array, only
+                # accepted once text follows it (a number may go on)
+                try:
+                    item, end = _JSON_DECODER.raw_decode(buf, pos)
+                except ValueError:
+                    end = None
+                if end is not None and (end < len(buf) or eof):
+                    if state == "key":
+                        if not isinstance(item, str):
+                            break
+                        name, state = item, "colon"
+                    else:
+                        state = "sep"
+                    step = end
+        if step is not None:
+            pos = step
+            continue
+        if eof:
+            break
+        # Read until the unread text has doubled, keeping long members linear
+        want, parts = max(1, len(buf) - pos), []
+        while want > 0:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                break
+            parts.append(chunk)
+            want -= len(chunk)
+        buf += "".join(parts)
+    return buf + "".join(chunks), None
+
+
+def iter_json_array(chunks, buf, pos):
+    """Yield the items of the array whose "[" ends at buf[pos], reading
+    more of chunks as needed. An item is only accepted once text follows
+    it, so a chunk boundary never cuts one short; after a failed attempt
+    the next waits until the unread text has doubled, keeping large items
+    linear to parse."""
+    pending, pending_len, need = [], 0, 0
+    while True:
+        if pending_len >= need:
+            if pending:
+                buf = buf[pos:] + "".join(pending)
+                pos, pending, pending_len = 0, [], 0
+            pos = _JSON_SKIP.match(buf, pos).end()
+            need = 1
+            if pos < len(buf):
+                if buf[pos] == "]":
+                    return
+                try:
+                    item, end = _JSON_DECODER.raw_decode(buf, pos)
+                except ValueError:
+                    end = None
+                if end is not None and end < len(buf):
+                    yield item
+                    pos, need = end, 0
+                    continue
+                need = len(buf) - pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            if pending:
+                need = 0
+                continue
+            raise ValueError("unterminated JSON array")
+        pending.append(chunk)
+        pending_len += len(chunk)
+
+
+def iter_geojson_features(source, path=("features",)):
+    """Features of a GeoJSON FeatureCollection read incrementally from source.
+
+    path locates the features array (see seek_json_array); the GeoJSON
+    object is the value at path[:-1]. A bare Feature or geometry yields
+    itself (as a Feature); those are small, so they are simply parsed whole.
+    """
+    chunks = iter_text_chunks(source)
+    buf, pos = seek_json_array(chunks, path)
+    if pos is not None:
+        yield from iter_json_array(chunks, buf, pos)
+        return
+    data = json.loads(buf)
+    for key in path[:-1]:
+        data = data.get(key) or {}
+    if data.get("type") == "FeatureCollection":
+        yield from data.get("features") or []
+    elif data.get("type") == "Feature":
+        yield data
+    else:
+        yield {"type": "Feature", "geometry": data}
+
+
+def feature_lines(feature):
+    """(lon, lat) point lists of a feature's LineString/MultiLineString parts."""
+    geom = feature.get("geometry") or {}
+    if geom.get("type") == "LineString":
+        parts = [geom["coordinates"]]
+    elif geom.get("type") == "MultiLineString":
+        parts = geom["coordinates"]
+    else:
+        return []
+    return [[(float(x), float(y)) for x, y, *_ in part] for part in parts]
+
 
-    for i in range(1, len(coords) - 1):
-        lon_prev, lat_prev = coords[i - 1]
-        lon_curr, lat_curr = coords[i]
-        lon_next, lat_next = coords[i + 1]
+# =============== ORS RESPONSE CACHE ===============
 
-        dx1 = lon_curr - lon_prev
-        dy1 = lat_curr - lat_prev
-        dx2 = lon_next - lon_curr
-        dy2 = lat_next - lat_curr
+ORS_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+_ORS_CACHE_LOCK = threading.Lock()
 
-        mag1 = math.hypot(dx1, dy1)
-        mag2 = math.hypot(dx2, dy2)
-        angle = 0.0
-        if mag1 != 0 and mag2 != 0:
-            dot = dx1 * dx2 + dy1 * dy2
-            cos_theta = dot / (mag1 * mag2)
-            cos_theta = max(-1.0, min(1.0, cos_theta))
-            angle = math.degrees(math.acos(cos_theta))
 
-        lon_last, lat_last = last_kept
-        dist = haversine_m(lat_last, lon_last, lat_curr, lon_curr)
+def ors_cache_key(url, body):
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{url}\n{canonical}".encode("utf-8")).hexdigest()
 
-        if angle >= angle_threshold_deg or dist >= max_segment_dist_m:
-            simplified.append((lon_curr, lat_curr))
-            last_kept = (lon_curr, lat_curr)
 
-    simplified.append(coords[-1])
-    return simplified
+def _ors_cache_path(key):
+    return os.path.join(ORS_CACHE_DIR, key[:2], key + ".json")
+
+
+def ors_cache_get(key):
+    """Return the cached response for key, or None if missing or expired."""
+    path = _ors_cache_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if ORS_CACHE_TTL_S is not None and time.time() - entry.get("created", 0) > ORS_CACHE_TTL_S:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    # mtime doubles as the LRU access time
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry.get("response")
+
+
+_ORS_CACHE_CREATED = re.compile(r'\s*\{\s*"created"\s*:\s*([-+0-9.eE]+)')
+
+
+def ors_cache_open(key):
+    """ors_cache_get as an open binary file, for streaming; only the
+    "created" stamp at the head of the entry is read here."""
+    path = _ors_cache_path(key)
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    m = _ORS_CACHE_CREATED.match(f.read(64).decode("utf-8", "replace"))
+    created = float(m.group(1)) if m else 0.0
+    if ORS_CACHE_TTL_S is not None and time.time() - created > ORS_CACHE_TTL_S:
+        f.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    f.seek(0)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return f
+
+
+def ors_cache_put(key, url, body, response):
+    path = _ors_cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {"created": time.time(), "url": url, "body": body, "response": response},
+            f,
+        )
+    os.replace(tmp, path)
+    ors_cache_evict(ORS_CACHE_MAX_BYTES)
+
+
+def evict_lru(cache_dir, suffix, max_bytes):
+    """Delete least recently used suffix files under cache_dir until they fit
+    in max_bytes; returns how many were deleted."""
+    if max_bytes is None or not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith(suffix):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+    entries.sort()
+    evicted = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def ors_cache_evict(max_bytes):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    evicted = evict_lru(ORS_CACHE_DIR, ".json", max_bytes)
+    with _ORS_CACHE_LOCK:
+        ORS_CACHE_STATS["evictions"] += evicted
 
 
 # =============== ORS HELPERS ===============
 
-def ors_route(start_lon, start_lat, end_lon, end_lat, alt_count=0):
+_ORS_SESSION = None
+_ORS_SESSION_LOCK = threading.Lock()
+_ORS_RATE_LOCK = threading.Lock()
+_ORS_NEXT_SLOT = 0.0
+
+
+def ors_session():
+    """Shared keep-alive session, sized so every worker gets a pooled connection."""
+    global _ORS_SESSION
+    with _ORS_SESSION_LOCK:
+        if _ORS_SESSION is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=max(1, ORS_MAX_WORKERS),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _ORS_SESSION = session
+        return _ORS_SESSION
+
+
+def ors_rate_limit():
+    """Block until the next request slot under ORS_MAX_REQUESTS_PER_MIN."""
+    global _ORS_NEXT_SLOT
+    if not ORS_MAX_REQUESTS_PER_MIN:
+        return
+    interval = 60.0 / ORS_MAX_REQUESTS_PER_MIN
+    with _ORS_RATE_LOCK:
+        now = time.monotonic()
+        slot = max(now, _ORS_NEXT_SLOT)
+        _ORS_NEXT_SLOT = slot + interval
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def ors_request(url, body, stream=False):
+    """POST a JSON body to ORS (rate limited) and return the 200 response."""
+    if not ORS_API_KEY and url.startswith(ORS_PUBLIC_URL):
+        raise RuntimeError("ORS_API_KEY not found in .env")
+
+    ors_rate_limit()
+    headers = {"Content-Type": "application/json"}
+    if ORS_API_KEY:
+        headers["Authorization"] = ORS_API_KEY
+    resp = ors_session().post(url, headers=headers, json=body, timeout=30, stream=stream)
+    if resp.status_code != 200:
+        raise RuntimeError(f"ORS error {resp.status_code}: {resp.text}")
+    return resp
+
+
+def ors_post(url, body):
+    """POST a JSON body to ORS and return the decoded reply, going through the cache."""
+    key = ors_cache_key(url, body)
+    if ORS_CACHE_ENABLED:
+        cached = ors_cache_get(key)
+        with _ORS_CACHE_LOCK:
+            ORS_CACHE_STATS["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            return cached
+        if ORS_CACHE_ONLY:
+            raise RuntimeError(f"ORS cache miss in cache-only mode: {url}")
+
+    data = ors_request(url, body).json()
+    if ORS_CACHE_ENABLED:
+        ors_cache_put(key, url, body, data)
+    return data
+
+
+def ors_post_features(url, body):
+    """ors_post for GeoJSON replies, yielding features as the reply streams in.
+
+    Cached replies are streamed from disk the same way. A fresh reply is
+    copied into its cache entry chunk by chunk instead of being decoded
+    whole; the entry only replaces the old one once fully read.
+    """
+    key = ors_cache_key(url, body)
+    if ORS_CACHE_ENABLED:
+        cached = ors_cache_open(key)
+        with _ORS_CACHE_LOCK:
+            ORS_CACHE_STATS["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            with cached:
+                yield from iter_geojson_features(cached, ("response", "features"))
+            return
+        if ORS_CACHE_ONLY:
+            raise RuntimeError(f"ORS cache miss in cache-only mode: {url}")
+
+    with ors_request(url, body, stream=True) as resp:
+        chunks = resp.iter_content(STREAM_CHUNK_BYTES)
+        if not ORS_CACHE_ENABLED:
+            yield from iter_geojson_features(chunks)
+            return
+
+        path = _ors_cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        done = False
+        try:
+            with open(tmp, "wb") as out:
+                head = json.dumps({"created": time.time(), "url": url, "body": body})
+                out.write(head[:-1].encode("utf-8") + b', "response": ')
+
+                def tee():
+                    for chunk in chunks:
+                        out.write(chunk)
+                        yield chunk
+
+                copied = tee()
+                yield from iter_geojson_features(copied)
+                for _ in copied:   # the rest of the reply (metadata)
+                    pass
+                out.write(b"}")
+            os.replace(tmp, path)
+            done = True
+        finally:
+            if not done:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+    ors_cache_evict(ORS_CACHE_MAX_BYTES)
+
+
+def ors_route_iter(start_lon, start_lat, end_lon, end_lat, alt_count=0):
+    """Yield the [lon, lat] coordinate list of each route ORS returns, as
+    each arrives."""
     alt_count = max(0, min(int(alt_count), 2))
 
     body = {
@@ -118,41 +1025,63 @@ def ors_route(start_lon, start_lat, end_lon, end_lat, alt_count=0):
             "weight_factor": 2.0,
         }
 
-    resp = requests.post(
-        "https://api.openrouteservice.org/v2/directions/foot-walking/geojson",
-        headers={
-            "Authorization": ORS_API_KEY,
-            "Content-Type": "application/json",
-        },
-        json=body,
-        timeout=30,
-    )
-    if resp.status_code != 200:
-        raise RuntimeError(f"ORS error {resp.status_code}: {resp.text}")
-
-    data = resp.json()
-    features = data.get("features", [])
-    routes = []
-    for feat in features:
+    for feat in ors_post_features(
+        f"{ORS_BASE_URL}/v2/directions/foot-walking/geojson",
+        body,
+    ):
         coords = feat.get("geometry", {}).get("coordinates", [])
-        if not coords:
-            continue
-        if len(coords) > 1200:
-            step = math.ceil(len(coords) / 1200)
-            coords = coords[::step]
-        routes.append(coords)
+        if coords:
+            yield coords
 
-    return routes
+
+def ors_route(start_lon, start_lat, end_lon, end_lat, alt_count=0):
+    return list(ors_route_iter(start_lon, start_lat, end_lon, end_lat, alt_count))
+
+
+def ors_route_many(queries, max_workers=None):
+    """Run ors_route for each (start_lon, start_lat, end_lon, end_lat) query.
+
+    Requests run concurrently on the shared session; results come back in
+    query order, each either a list of routes or the RuntimeError raised.
+    """
+    max_workers = ORS_MAX_WORKERS if max_workers is None else max_workers
+
+    def fetch(query):
+        try:
+            return ors_route(*query, alt_count=0)
+        except RuntimeError as e:
+            return e
+
+    if max_workers <= 1 or len(queries) <= 1:
+        return [fetch(q) for q in queries]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(fetch, queries))
+
+
+def ors_matrix(locations, sources, destinations):
+    """Walking distances (m) from every source to every destination.
+
+    locations are [lon, lat] pairs and sources/destinations index into
+    them, as in the ORS matrix API. Returns one row per source; an entry
+    is None where ORS found no path.
+    """
+    data = ors_post(
+        f"{ORS_BASE_URL}/v2/matrix/foot-walking",
+        {
+            "locations": [list(loc) for loc in locations],
+            "sources": list(sources),
+            "destinations": list(destinations),
+            "metrics": ["distance"],
+        },
+    )
+    return data.get("distances") or []
 
 
 def find_closest_index(route, lon, lat):
-    best_idx = 0
-    best_dist = float("inf")
-    for i, (lon2, lat2) in enumerate(route):
-        d = haversine_m(lat, lon, lat2, lon2)
-        if d < best_dist:
-            best_dist = d
-            best_idx = i
+    lats, lons = coord_arrays([(lat2, lon2) for lon2, lat2 in route])
+    best_idx, best_dist = nearest_index(lat, lon, lats, lons)
+    if best_idx is None:
+        return 0, best_dist
     return best_idx, best_dist
 
 
@@ -204,30 +1133,392 @@ def build_graph_from_routes(
     return nodes_arr
 
 
+# =============== COMPACT GRAPH ===============
+
+def _csr_from_keys(n, keys):
+    """CSR offsets/indices from sorted, unique directed edge keys u * n + v."""
+    if np is not None and not isinstance(keys, list):
+        offsets = np.searchsorted(keys, np.arange(n + 1, dtype=np.int64) * n)
+        return (
+            array("q", offsets.astype(np.int64).tobytes()),
+            array("i", (keys % n).astype(np.int32).tobytes()),
+        )
+    offsets = array("q", (bisect_left(keys, u * n) for u in range(n + 1)))
+    return offsets, array("i", (k % n for k in keys))
+
+
+def _csr_from_pairs(n, us, vs):
+    """CSR offsets/indices from undirected (u, v) pairs.
+
+    Both directions are stored; rows come out sorted with duplicates and
+    self loops dropped.
+    """
+    if np is not None and len(us) >= NUMPY_MIN_BATCH:
+        u = np.asarray(us, dtype=np.int64)
+        v = np.asarray(vs, dtype=np.int64)
+        keep = u != v
+        u, v = u[keep], v[keep]
+        return _csr_from_keys(n, np.unique(np.concatenate((u * n + v, v * n + u))))
+    keys = set()
+    for u, v in zip(us, vs):
+        if u != v:
+            keys.add(u * n + v)
+            keys.add(v * n + u)
+    return _csr_from_keys(n, sorted(keys))
+
+
+class CompactGraph:
+    """Node coordinates in flat arrays plus CSR adjacency with an edit buffer.
+
+    Row u is indices[offsets[u]:offsets[u + 1]], sorted. add_edge and
+    remove_edge only touch two small buffers, so passes can edit freely;
+    compact() folds the buffers back into the arrays and every pass calls
+    it once when done. While edits are pending, neighbors(u) lists the
+    remaining base row first, then added neighbours in insertion order.
+
+    Per node this costs 16 bytes of coordinates, 8 bytes of offset and 4
+    bytes per adjacency entry: 35-55 bytes per node on 50k-node synthetic
+    networks, against about 350 for the old list of (lat, lon) tuples plus
+    list of neighbour sets.
+
+    All planar geometry goes through proj: x and y (metres) are projected
+    once, on first use of xy(), and graphs derived from this one pass the
+    same projection on so their distances stay comparable.
+    """
+
+    __slots__ = (
+        "lat", "lon", "offsets", "indices", "proj", "_x", "_y", "_added", "_removed",
+    )
+
+    def __init__(self, lat, lon, offsets=None, indices=None, proj=None):
+        self.lat = array("d", lat)
+        self.lon = array("d", lon)
+        if offsets is None:
+            offsets, indices = array("q", bytes(8 * (len(self.lat) + 1))), array("i")
+        self.offsets = offsets
+        self.indices = indices
+        self.proj = proj or LocalProjection.around(self.lat, self.lon)
+        self._x = self._y = None
+        self._added = {}
+        self._removed = set()
+
+    @classmethod
+    def from_pairs(cls, lat, lon, us, vs, proj=None):
+        """Build from undirected edges given as two parallel index sequences."""
+        offsets, indices = _csr_from_pairs(len(lat), us, vs)
+        return cls(lat, lon, offsets, indices, proj)
+
+    def xy(self):
+        """Cached planar coordinates in metres, as two array('d') columns."""
+        if self._x is None:
+            self._x, self._y = self.proj.forward(self.lat, self.lon)
+        return self._x, self._y
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _key(self, u, v):
+        n = len(self.lat)
+        return u * n + v if u < v else v * n + u
+
+    def _in_base(self, u, v):
+        lo, hi = self.offsets[u], self.offsets[u + 1]
+        i = bisect_left(self.indices, v, lo, hi)
+        return i < hi and self.indices[i] == v
+
+    def _row_ids(self):
+        """Owning row of every CSR entry, aligned with indices."""
+        n = len(self.lat)
+        if np is not None:
+            counts = np.diff(np.frombuffer(self.offsets, dtype=np.int64))
+            return np.repeat(np.arange(n, dtype=np.int64), counts)
+        rows = array("i")
+        for u in range(n):
+            rows.extend([u] * (self.offsets[u + 1] - self.offsets[u]))
+        return rows
+
+    def neighbors(self, u):
+        row = self.indices[self.offsets[u]:self.offsets[u + 1]]
+        if self._removed:
+            row = [v for v in row if self._key(u, v) not in self._removed]
+        added = self._added.get(u)
+        if added:
+            row = list(row)
+            row.extend(added)
+        return row
+
+    def has_edge(self, u, v):
+        added = self._added.get(u)
+        if added and v in added:
+            return True
+        return self._in_base(u, v) and self._key(u, v) not in self._removed
+
+    def add_edge(self, u, v):
+        if u == v or self.has_edge(u, v):
+            return False
+        key = self._key(u, v)
+        if key in self._removed:
+            self._removed.discard(key)
+        else:
+            self._added.setdefault(u, []).append(v)
+            self._added.setdefault(v, []).append(u)
+        return True
+
+    def remove_edge(self, u, v):
+        added = self._added.get(u)
+        if added and v in added:
+            added.remove(v)
+            self._added[v].remove(u)
+            return True
+        key = self._key(u, v)
+        if key in self._removed or not self._in_base(u, v):
+            return False
+        self._removed.add(key)
+        return True
+
+    def add_edges(self, us, vs):
+        """Add many undirected edges at once; compacts the graph."""
+        self.compact()
+        base_u, base_v = self.edge_arrays()
+        if np is not None:
+            all_u = np.concatenate((np.asarray(base_u, dtype=np.int64), np.asarray(us, dtype=np.int64)))
+            all_v = np.concatenate((np.asarray(base_v, dtype=np.int64), np.asarray(vs, dtype=np.int64)))
+        else:
+            all_u = list(base_u) + list(us)
+            all_v = list(base_v) + list(vs)
+        self.offsets, self.indices = _csr_from_pairs(len(self.lat), all_u, all_v)
+        return self
+
+    def edges(self):
+        """Yield every live edge once as (u, v) with u < v."""
+        for u in range(len(self.lat)):
+            for v in self.neighbors(u):
+                if u < v:
+                    yield u, v
+
+    def edge_arrays(self):
+        """Live edges as two parallel int arrays (u < v), in edges() order."""
+        if self._added or self._removed:
+            us, vs = array("i"), array("i")
+            for u, v in self.edges():
+                us.append(u)
+                vs.append(v)
+            return us, vs
+        rows = self._row_ids()
+        if np is not None:
+            cols = np.frombuffer(self.indices, dtype=np.int32)
+            keep = rows < cols
+            return (
+                array("i", rows[keep].astype(np.int32).tobytes()),
+                array("i", cols[keep].tobytes()),
+            )
+        pairs = [(u, v) for u, v in zip(rows, self.indices) if u < v]
+        return array("i", (u for u, _ in pairs)), array("i", (v for _, v in pairs))
+
+    def slot_lengths(self):
+        """Planar length (m) of every CSR entry, aligned with indices.
+
+        Only meaningful on a compacted graph; pending edits are ignored.
+        """
+        rows = self._row_ids()
+        xs, ys = self.xy()
+        if np is not None:
+            x = np.frombuffer(xs, dtype=float)
+            y = np.frombuffer(ys, dtype=float)
+            cols = np.frombuffer(self.indices, dtype=np.int32)
+            lens = np.hypot(x[cols] - x[rows], y[cols] - y[rows])
+            return array("d", lens.tobytes())
+        return array("d", (
+            math.hypot(xs[v] - xs[u], ys[v] - ys[u])
+            for u, v in zip(rows, self.indices)
+        ))
+
+    def edge_count(self):
+        if not self._added and not self._removed:
+            return len(self.indices) // 2
+        return sum(1 for _ in self.edges())
+
+    def compact(self):
+        """Fold pending edits into the CSR arrays."""
+        if not self._added and not self._removed:
+            return self
+        n = len(self.lat)
+        keys = set()
+        rows = self._row_ids()
+        for u, v in zip(rows, self.indices):
+            u = int(u)
+            if u < v and u * n + v not in self._removed:
+                keys.add(u * n + v)
+                keys.add(v * n + u)
+        for u, added in self._added.items():
+            keys.update(u * n + v for v in added)
+        self.offsets, self.indices = _csr_from_keys(n, sorted(keys))
+        self._added = {}
+        self._removed = set()
+        return self
+
+
+# =============== STAGE CHECKPOINTS ===============
+# Each clean_graph pass's output graph is saved under a key that chains the
+# previous stage's key with the pass name, its parameters and a digest of
+# this script. The first key hashes the raw input JSON, so every key stands
+# for "this input graph after these passes with these settings".
+
+STAGE_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+STAGE_CACHE_MAGIC = b"AIDS"
+STAGE_CACHE_VERSION = 1
+STAGE_CACHE_HEADER = struct.Struct("<4sHIIdd")   # magic, version, N, len(indices), lat0, lon0
+_SCRIPT_DIGEST = None
+
+
+def script_digest():
+    """sha256 of this file, so any code change invalidates old checkpoints."""
+    global _SCRIPT_DIGEST
+    if _SCRIPT_DIGEST is None:
+        with open(os.path.abspath(__file__), "rb") as f:
+            _SCRIPT_DIGEST = hashlib.sha256(f.read()).hexdigest()
+    return _SCRIPT_DIGEST
+
+
+def graph_input_key(json_nodes):
+    canonical = json.dumps(json_nodes, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{script_digest()}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def stage_cache_key(parent_key, name, args):
+    canonical = json.dumps([name, list(args)], separators=(",", ":"))
+    return hashlib.sha256(f"{parent_key}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def _stage_cache_path(key):
+    return os.path.join(STAGE_CACHE_DIR, key[:2], key + ".graph")
+
+
+def graph_to_bytes(graph):
+    graph.compact()
+    header = STAGE_CACHE_HEADER.pack(
+        STAGE_CACHE_MAGIC, STAGE_CACHE_VERSION, len(graph), len(graph.indices),
+        graph.proj.lat0, graph.proj.lon0,
+    )
+    parts = [header]
+    for arr in (graph.lat, graph.lon, graph.offsets, graph.indices):
+        if sys.byteorder != "little":
+            arr = array(arr.typecode, arr)
+            arr.byteswap()
+        parts.append(arr.tobytes())
+    return b"".join(parts)
+
+
+def graph_from_bytes(data):
+    magic, version, n, m, lat0, lon0 = STAGE_CACHE_HEADER.unpack_from(data)
+    if magic != STAGE_CACHE_MAGIC or version != STAGE_CACHE_VERSION:
+        raise ValueError("not a stage checkpoint")
+    pos = STAGE_CACHE_HEADER.size
+    arrays = []
+    for typecode, count in (("d", n), ("d", n), ("q", n + 1), ("i", m)):
+        arr = array(typecode)
+        size = arr.itemsize * count
+        arr.frombytes(data[pos:pos + size])
+        if sys.byteorder != "little":
+            arr.byteswap()
+        arrays.append(arr)
+        pos += size
+    if pos != len(data):
+        raise ValueError("truncated stage checkpoint")
+    lat, lon, offsets, indices = arrays
+    return CompactGraph(lat, lon, offsets, indices, LocalProjection(lat0, lon0))
+
+
+def stage_cache_get(key):
+    """Return the checkpointed graph for key, or None."""
+    path = _stage_cache_path(key)
+    try:
+        with open(path, "rb") as f:
+            graph = graph_from_bytes(f.read())
+    except (OSError, ValueError, struct.error):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return graph
+
+
+def stage_cache_has(key):
+    return os.path.exists(_stage_cache_path(key))
+
+
+def stage_cache_put(key, graph):
+    path = _stage_cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(graph_to_bytes(graph))
+    os.replace(tmp, path)
+    STAGE_CACHE_STATS["evictions"] += evict_lru(STAGE_CACHE_DIR, ".graph", STAGE_CACHE_MAX_BYTES)
+
+
+def run_passes_cached(json_nodes, passes):
+    """json_to_internal followed by passes [(name, fn, args)], resuming from
+    the latest stage whose checkpoint exists and saving every stage run."""
+    if not STAGE_CACHE_ENABLED:
+        with profile_stage("json_to_internal"):
+            graph = json_to_internal(json_nodes)
+        for name, fn, args in passes:
+            graph = run_pass(name, fn, graph, *args)
+        return graph
+
+    keys = []
+    key = graph_input_key(json_nodes)
+    for name, _, args in passes:
+        key = stage_cache_key(key, name, args)
+        keys.append(key)
+
+    graph, start = None, 0
+    with profile_stage("stage_cache_load"):
+        for k in range(len(passes) - 1, -1, -1):
+            if stage_cache_has(keys[k]):
+                graph = stage_cache_get(keys[k])
+                if graph is not None:
+                    start = k + 1
+                    break
+    STAGE_CACHE_STATS["hits"] += start
+    STAGE_CACHE_STATS["misses"] += len(passes) - start
+
+    if graph is None:
+        with profile_stage("json_to_internal"):
+            graph = json_to_internal(json_nodes)
+    for (name, fn, args), key in zip(passes[start:], keys[start:]):
+        graph = run_pass(name, fn, graph, *args)
+        with profile_stage("stage_cache_save"):
+            stage_cache_put(key, graph)
+    return graph
+
+
 # =============== CLEANER HELPERS ===============
 
-def json_to_internal(json_nodes):
-    coords = []
-    neighbors = []
+def json_to_internal(json_nodes, proj=None):
     n = len(json_nodes)
-    for node in json_nodes:
-        coords.append((float(node["lat"]), float(node["lon"])))
-        neighbors.append(set())
-
+    lat = array("d")
+    lon = array("d")
+    us = array("i")
+    vs = array("i")
     for i, node in enumerate(json_nodes):
+        lat.append(float(node["lat"]))
+        lon.append(float(node["lon"]))
         for neigh_id in node.get("connected_to", []):
             j = neigh_id - 1
             if j < 0 or j >= n or j == i:
                 continue
-            neighbors[i].add(j)
-            neighbors[j].add(i)
+            us.append(i)
+            vs.append(j)
+    return CompactGraph.from_pairs(lat, lon, us, vs, proj)
 
-    return coords, neighbors
 
-
-def merge_close_nodes(coords, neighbors, merge_dist_m):
-    n = len(coords)
-    parent = list(range(n))
+def merge_close_nodes(graph, merge_dist_m):
+    n = len(graph)
+    lat, lon = graph.lat, graph.lon
+    parent = array("i", range(n))
 
     def find(x):
         while parent[x] != x:
@@ -244,61 +1535,57 @@ def merge_close_nodes(coords, neighbors, merge_dist_m):
         else:
             parent[ra] = rb
 
-    for i in range(n):
-        lat1, lon1 = coords[i]
-        for j in range(i + 1, n):
-            lat2, lon2 = coords[j]
-            d = haversine_m(lat1, lon1, lat2, lon2)
-            if d <= merge_dist_m:
-                union(i, j)
-
-    groups = {}
-    for i in range(n):
-        r = find(i)
-        groups.setdefault(r, []).append(i)
+    for i, j, _ in close_pairs(*graph.xy(), merge_dist_m):
+        union(i, j)
 
-    new_idx_map = {}
-    new_coords = []
-
-    for new_idx, (root, members) in enumerate(groups.items()):
-        if len(members) == 1:
-            lat, lon = coords[members[0]]
-        else:
-            lat = sum(coords[k][0] for k in members) / len(members)
-            lon = sum(coords[k][1] for k in members) / len(members)
-        new_coords.append((lat, lon))
-        for old in members:
-            new_idx_map[old] = new_idx
-
-    new_neighbors = [set() for _ in range(len(new_coords))]
-    for u in range(n):
-        for v in neighbors[u]:
-            nu = new_idx_map[u]
-            nv = new_idx_map[v]
-            if nu == nv:
-                continue
-            new_neighbors[nu].add(nv)
-            new_neighbors[nv].add(nu)
-
-    return new_coords, new_neighbors
-
-
-def connect_close_nodes(coords, neighbors, connect_dist_m):
-    n = len(coords)
+    # Groups are numbered in order of their lowest member, and coordinates
+    # are averaged in member order
+    new_of = array("i", bytes(4 * n))
+    sum_lat = array("d")
+    sum_lon = array("d")
+    size = array("i")
     for i in range(n):
-        lat1, lon1 = coords[i]
-        for j in range(i + 1, n):
-            lat2, lon2 = coords[j]
-            d = haversine_m(lat1, lon1, lat2, lon2)
-            if d <= connect_dist_m:
-                neighbors[i].add(j)
-                neighbors[j].add(i)
-    return neighbors
-
-
-def connect_components(coords, neighbors, max_dist_m):
-    n = len(coords)
-    comp = [-1] * n
+        r = find(i)
+        if r == i:
+            new_of[i] = len(size)
+            sum_lat.append(0.0)
+            sum_lon.append(0.0)
+            size.append(0)
+        k = new_of[i] = new_of[r]
+        sum_lat[k] += lat[i]
+        sum_lon[k] += lon[i]
+        size[k] += 1
+
+    for k, members in enumerate(size):
+        profile_histogram("merge_group_size", members)
+        if members > 1:
+            sum_lat[k] /= members
+            sum_lon[k] /= members
+
+    us, vs = graph.edge_arrays()
+    if np is not None:
+        remap = np.frombuffer(new_of, dtype=np.int32)
+        us = remap[np.frombuffer(us, dtype=np.int32)]
+        vs = remap[np.frombuffer(vs, dtype=np.int32)]
+    else:
+        us = [new_of[u] for u in us]
+        vs = [new_of[v] for v in vs]
+
+    return CompactGraph.from_pairs(sum_lat, sum_lon, us, vs, graph.proj)
+
+
+def connect_close_nodes(graph, connect_dist_m):
+    us, vs = array("i"), array("i")
+    for i, j, _ in close_pairs(*graph.xy(), connect_dist_m):
+        us.append(i)
+        vs.append(j)
+    return graph.add_edges(us, vs)
+
+
+def connect_components(graph, max_dist_m):
+    n = len(graph)
+    xs, ys = graph.xy()
+    comp = array("i", [-1]) * n
     comp_id = 0
 
     for i in range(n):
@@ -308,430 +1595,2136 @@ def connect_components(coords, neighbors, max_dist_m):
         comp[i] = comp_id
         while stack:
             u = stack.pop()
-            for v in neighbors[u]:
+            for v in graph.neighbors(u):
                 if comp[v] == -1:
                     comp[v] = comp_id
                     stack.append(v)
         comp_id += 1
 
     if comp_id <= 1:
-        return neighbors
-
-    nodes_in_comp = [[] for _ in range(comp_id)]
-    for i, cid in enumerate(comp):
-        nodes_in_comp[cid].append(i)
-
-    for c1 in range(comp_id):
-        for c2 in range(c1 + 1, comp_id):
-            best_d = float("inf")
-            best_pair = None
-            for i in nodes_in_comp[c1]:
-                lat1, lon1 = coords[i]
-                for j in nodes_in_comp[c2]:
-                    lat2, lon2 = coords[j]
-                    d = haversine_m(lat1, lon1, lat2, lon2)
-                    if d < best_d:
-                        best_d = d
-                        best_pair = (i, j)
-            if best_pair and best_d <= max_dist_m:
-                a, b = best_pair
-                neighbors[a].add(b)
-                neighbors[b].add(a)
-
-    return neighbors
+        return graph
 
-
-def split_edges_by_near_nodes(coords, neighbors, near_line_dist_m):
-    n = len(coords)
-    edges = []
-    for u in range(n):
-        for v in neighbors[u]:
-            if u < v:
-                edges.append((u, v))
-
-    for (u, v) in edges:
-        lat_u, lon_u = coords[u]
-        lat_v, lon_v = coords[v]
-
-        lat0 = lat_u
-        m_per_deg_lat = 111320.0
-        m_per_deg_lon = 111320.0 * math.cos(math.radians(lat0))
-
-        def ll_to_xy(lat, lon):
-            x = (lon - lon_u) * m_per_deg_lon
-            y = (lat - lat_u) * m_per_deg_lat
-            return x, y
-
-        xA, yA = ll_to_xy(lat_u, lon_u)
-        xB, yB = ll_to_xy(lat_v, lon_v)
-        dxAB = xB - xA
-        dyAB = yB - yA
+    # Closest cross-component pair per component pair, only looking at
+    # nodes within max_dist_m of each other. Component pairs further apart
+    # than that never produce a candidate, so they cost nothing.
+    index = build_grid_index(xs, ys, max_dist_m)
+    best = {}
+    for i in range(n):
+        x1, y1 = xs[i], ys[i]
+        ci = comp[i]
+        for j in grid_query(index, x1, y1, max_dist_m):
+            if j <= i or comp[j] == ci:
+                continue
+            d = math.hypot(xs[j] - x1, ys[j] - y1)
+            if d > max_dist_m:
+                continue
+            if ci < comp[j]:
+                key, cand = (ci, comp[j]), (d, i, j)
+            else:
+                key, cand = (comp[j], ci), (d, j, i)
+            if key not in best or cand < best[key]:
+                best[key] = cand
+
+    links = [best[key][1:] for key in sorted(best)]
+    return graph.add_edges([a for a, _ in links], [b for _, b in links])
+
+
+def split_edges_by_near_nodes(graph, near_line_dist_m):
+    xs, ys = graph.xy()
+    us, vs = graph.edge_arrays()
+
+    # Nodes bucketed once; each edge only looks at nodes inside its bounding
+    # box padded by near_line_dist_m
+    index = build_grid_index(xs, ys, 2 * near_line_dist_m)
+    pad = near_line_dist_m
+    if np is not None:
+        xs_np = np.frombuffer(xs, dtype=float)
+        ys_np = np.frombuffer(ys, dtype=float)
+
+    new_u, new_v = array("i"), array("i")
+    for u, v in zip(us, vs):
+        x_u, y_u = xs[u], ys[u]
+        x_v, y_v = xs[v], ys[v]
+        dxAB = x_v - x_u
+        dyAB = y_v - y_u
         lenAB2 = dxAB * dxAB + dyAB * dyAB
         if lenAB2 == 0:
             continue
 
-        for w in range(n):
-            if w == u or w == v:
-                continue
-            lat_w, lon_w = coords[w]
-            xC, yC = ll_to_xy(lat_w, lon_w)
+        cands = sorted(
+            w for w in grid_query_box(
+                index,
+                min(x_u, x_v) - pad,
+                max(x_u, x_v) + pad,
+                min(y_u, y_v) - pad,
+                max(y_u, y_v) + pad,
+            )
+            if w != u and w != v
+        )
 
-            t = ((xC - xA) * dxAB + (yC - yA) * dyAB) / lenAB2
-            if t < 0.0 or t > 1.0:
-                continue
+        if np is not None and len(cands) >= NUMPY_MIN_BATCH:
+            xC = xs_np[cands] - x_u
+            yC = ys_np[cands] - y_u
+            t = (xC * dxAB + yC * dyAB) / lenAB2
+            d_perp = np.hypot(xC - t * dxAB, yC - t * dyAB)
+            hit = (t >= 0.0) & (t <= 1.0) & (d_perp <= near_line_dist_m)
+            near = [cands[k] for k in np.flatnonzero(hit)]
+        else:
+            near = []
+            for w in cands:
+                xC = xs[w] - x_u
+                yC = ys[w] - y_u
 
-            xD = xA + t * dxAB
-            yD = yA + t * dyAB
-            d_perp = math.hypot(xC - xD, yC - yD)
+                t = (xC * dxAB + yC * dyAB) / lenAB2
+                if t < 0.0 or t > 1.0:
+                    continue
 
-            if d_perp <= near_line_dist_m:
-                neighbors[u].add(w)
-                neighbors[w].add(u)
-                neighbors[v].add(w)
-                neighbors[w].add(v)
+                d_perp = math.hypot(xC - t * dxAB, yC - t * dyAB)
+                if d_perp <= near_line_dist_m:
+                    near.append(w)
 
-    return neighbors
+        for w in near:
+            new_u.extend((u, v))
+            new_v.extend((w, w))
 
+    return graph.add_edges(new_u, new_v)
 
-def shortest_path_bfs(neighbors, start, end):
-    q = deque([start])
-    prev = {start: None}
-    while q:
-        u = q.popleft()
-        if u == end:
-            break
-        for v in neighbors[u]:
-            if v not in prev:
-                prev[v] = u
-                q.append(v)
-    if end not in prev:
-        return None
-    path = []
-    cur = end
-    while cur is not None:
-        path.append(cur)
-        cur = prev[cur]
-    path.reverse()
-    return path
 
+def shortest_path_bounded(graph, slot_len, start, end, max_len,
+                          counter="prune_search_expansions"):
+    """Length-weighted A* from start to end that gives up past max_len metres.
 
-def prune_skip_edges(coords, neighbors, max_extra_ratio, max_perp_dist_m):
-    n = len(coords)
-    edges = []
-    for u in range(n):
-        for v in neighbors[u]:
-            if u < v:
-                edges.append((u, v))
-
-    for (u, v) in edges:
-        if v not in neighbors[u]:
-            continue
-        lat_u, lon_u = coords[u]
-        lat_v, lon_v = coords[v]
-        direct_len = haversine_m(lat_u, lon_u, lat_v, lon_v)
+    Returns (path, length), or (None, inf) if end cannot be reached within
+    max_len. Edge lengths and the straight-line heuristic are both planar,
+    so the heuristic never overestimates and the search stays local to the
+    ellipse around start and end that the length budget allows.
 
-        neighbors[u].remove(v)
-        neighbors[v].remove(u)
+    slot_len comes from graph.slot_lengths(). The graph may have pending
+    removals (they are skipped) but no pending additions. Expanded nodes
+    are tallied in the profiling counter named by counter.
+    """
+    xs, ys = graph.xy()
+    offsets, indices = graph.offsets, graph.indices
+    removed = graph._removed
+    n = len(graph)
+    x_e, y_e = xs[end], ys[end]
+    dist = {start: 0.0}
+    prev = {start: None}
+    heap = [(0.0, 0.0, start)]
 
-        path = shortest_path_bfs(neighbors, u, v)
-        if path is None:
-            neighbors[u].add(v)
-            neighbors[v].add(u)
+    while heap:
+        _, g, u = heapq.heappop(heap)
+        if PROFILING:
+            PROFILE_COUNTERS[counter] += 1
+        if u == end:
+            path = []
+            cur = end
+            while cur is not None:
+                path.append(cur)
+                cur = prev[cur]
+            path.reverse()
+            return path, g
+        if g > dist[u]:
             continue
+        for k in range(offsets[u], offsets[u + 1]):
+            v = indices[k]
+            if removed and (u * n + v if u < v else v * n + u) in removed:
+                continue
+            ng = g + slot_len[k]
+            if ng >= dist.get(v, float("inf")):
+                continue
+            f = ng + math.hypot(xs[v] - x_e, ys[v] - y_e)
+            if f > max_len:
+                continue
+            dist[v] = ng
+            prev[v] = u
+            heapq.heappush(heap, (f, ng, v))
 
-        path_len = 0.0
-        for i in range(len(path) - 1):
-            a, b = path[i], path[i + 1]
-            lat_a, lon_a = coords[a]
-            lat_b, lon_b = coords[b]
-            path_len += haversine_m(lat_a, lon_a, lat_b, lon_b)
+    return None, float("inf")
 
-        if path_len > direct_len * (1 + max_extra_ratio):
-            neighbors[u].add(v)
-            neighbors[v].add(u)
-            continue
 
-        lat0 = lat_u
-        m_per_deg_lat = 111320.0
-        m_per_deg_lon = 111320.0 * math.cos(math.radians(lat0))
-
-        def ll_to_xy(lat, lon):
-            x = (lon - lon_u) * m_per_deg_lon
-            y = (lat - lat_u) * m_per_deg_lat
-            return x, y
-
-        xA, yA = ll_to_xy(lat_u, lon_u)
-        xB, yB = ll_to_xy(lat_v, lon_v)
-        dxAB = xB - xA
-        dyAB = yB - yA
-        lenAB = math.hypot(dxAB, dyAB)
-        if lenAB == 0:
-            neighbors[u].add(v)
-            neighbors[v].add(u)
+def prune_skip_edges(graph, max_extra_ratio, max_perp_dist_m, owners=None):
+    """Drop edges that a near-straight, barely longer path duplicates.
+
+    With owners (one flag per node) only edges whose lower endpoint is
+    flagged are considered; the tiled pass uses it to keep halo edges.
+    """
+    graph.compact()
+    xs, ys = graph.xy()
+    offsets, indices = graph.offsets, graph.indices
+    slot_len = graph.slot_lengths()
+
+    for u in range(len(graph)):
+        if owners is not None and not owners[u]:
             continue
+        x_u, y_u = xs[u], ys[u]
+        for k in range(offsets[u], offsets[u + 1]):
+            v = indices[k]
+            if v < u:
+                continue
 
-        ok_collinear = True
-        for w in path[1:-1]:
-            lat_w, lon_w = coords[w]
-            xC, yC = ll_to_xy(lat_w, lon_w)
+            graph.remove_edge(u, v)
+
+            profile_count("prune_searches")
+            path, _ = shortest_path_bounded(
+                graph,
+                slot_len,
+                u,
+                v,
+                slot_len[k] * (1 + max_extra_ratio),
+            )
+            if path is None:
+                graph.add_edge(u, v)
+                continue
 
-            t = ((xC - xA) * dxAB + (yC - yA) * dyAB) / (lenAB ** 2)
-            t = max(0.0, min(1.0, t))
-            xD = xA + t * dxAB
-            yD = yA + t * dyAB
-            d_perp = math.hypot(xC - xD, yC - yD)
+            dxAB = xs[v] - x_u
+            dyAB = ys[v] - y_u
+            lenAB2 = dxAB * dxAB + dyAB * dyAB
+            if lenAB2 == 0:
+                graph.add_edge(u, v)
+                continue
 
-            if d_perp > max_perp_dist_m:
-                ok_collinear = False
-                break
+            ok_collinear = True
+            for w in path[1:-1]:
+                xC = xs[w] - x_u
+                yC = ys[w] - y_u
 
-        if not ok_collinear:
-            neighbors[u].add(v)
-            neighbors[v].add(u)
+                t = (xC * dxAB + yC * dyAB) / lenAB2
+                t = max(0.0, min(1.0, t))
+                d_perp = math.hypot(xC - t * dxAB, yC - t * dyAB)
 
-    return neighbors
+                if d_perp > max_perp_dist_m:
+                    ok_collinear = False
+                    break
 
+            if not ok_collinear:
+                graph.add_edge(u, v)
 
-def internal_to_json(coords, neighbors):
-    N = len(coords)
+    return graph.compact()
 
-    def closest_index(target_lat, target_lon):
-        best = None
-        best_d = float("inf")
-        for i, (lat, lon) in enumerate(coords):
-            d = haversine_m(target_lat, target_lon, lat, lon)
-            if d < best_d:
-                best_d = d
-                best = i
-        return best
 
-    start_idx = closest_index(START_LAT, START_LON)
-    dest_idx = closest_index(END_LAT, END_LON)
+def internal_to_json(graph, start=None, end=None):
+    start_lat, start_lon = start or (START_LAT, START_LON)
+    end_lat, end_lon = end or (END_LAT, END_LON)
 
-    all_idx = list(range(N))
-    middle = [i for i in all_idx if i not in {start_idx, dest_idx}]
-    middle.sort()
+    N = len(graph)
+    start_idx, _ = nearest_index(start_lat, start_lon, graph.lat, graph.lon)
+    dest_idx, _ = nearest_index(end_lat, end_lon, graph.lat, graph.lon)
 
     ordered = []
     if start_idx is not None:
         ordered.append(start_idx)
-    ordered.extend(middle)
+    ordered.extend(i for i in range(N) if i != start_idx and i != dest_idx)
     if dest_idx is not None and dest_idx not in ordered:
         ordered.append(dest_idx)
 
-    mapping = {old: i + 1 for i, old in enumerate(ordered)}
-
-    nodes_out = [None] * len(mapping)
-    conn_sets = {new_id: set() for new_id in mapping.values()}
-
-    for old in all_idx:
-        new_id = mapping[old]
-        lat, lon = coords[old]
-        nodes_out[new_id - 1] = {
-            "id": new_id,
-            "lat": lat,
-            "lon": lon,
-            "connected_to": [],
+    return ordered_to_json(graph, ordered, dest_idx)
+
+
+def next_hop_table(graph, dest):
+    """Length-weighted Dijkstra from dest over a compacted graph.
+
+    Returns (next_hop, dist): for every node the neighbour to step to on a
+    shortest path toward dest and the remaining distance in metres. dest
+    itself and nodes that cannot reach it get next hop -1; unreachable
+    nodes get distance inf.
+    """
+    n = len(graph)
+    offsets, indices = graph.offsets, graph.indices
+    slot_len = graph.slot_lengths()
+    dist = array("d", [math.inf]) * n
+    next_hop = array("i", [-1]) * n
+    dist[dest] = 0.0
+    heap = [(0.0, dest)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for k in range(offsets[u], offsets[u + 1]):
+            v = indices[k]
+            nd = d + slot_len[k]
+            if nd < dist[v]:
+                dist[v] = nd
+                next_hop[v] = u
+                heapq.heappush(heap, (nd, v))
+    return next_hop, dist
+
+
+def ordered_to_json(graph, ordered, dest=None):
+    """route.json nodes for graph, numbering node ordered[k] as id k + 1.
+
+    With EMBED_NAV_TABLE and a dest node, every node also carries its
+    shortest-path next hop toward dest, the remaining distance, and the
+    length and bearing of each edge in connected_to order, so the app can
+    step along the route without any searching or trigonometry.
+    """
+    new_id = array("i", bytes(4 * len(graph)))
+    for i, old in enumerate(ordered):
+        new_id[old] = i + 1
+
+    nav = EMBED_NAV_TABLE and dest is not None
+    if nav:
+        with profile_stage("next_hop_table"):
+            graph.compact()
+            next_hop, dist = next_hop_table(graph, dest)
+
+    xs, ys = graph.xy()
+    nodes_out = []
+    for old in ordered:
+        lat_u, lon_u = graph.lat[old], graph.lon[old]
+        neigh = sorted((new_id[v], v) for v in graph.neighbors(old) if v != old)
+        node = {
+            "id": new_id[old],
+            "lat": lat_u,
+            "lon": lon_u,
+            "connected_to": [nid for nid, _ in neigh],
         }
+        if nav:
+            hop = next_hop[old]
+            node["next_hop"] = new_id[hop] if hop >= 0 else None
+            node["dist_to_dest_m"] = round(dist[old], 2) if dist[old] < math.inf else None
+            node["edge_len_m"] = [
+                round(math.hypot(xs[v] - xs[old], ys[v] - ys[old]), 2) for _, v in neigh
+            ]
+            node["edge_bearing_deg"] = [
+                round(math.degrees(math.atan2(xs[v] - xs[old], ys[v] - ys[old])) % 360.0, 1)
+                for _, v in neigh
+            ]
+        if EMBED_SNAP_INDEX:
+            node["cell"] = snap_cell(lat_u, lon_u)
+        nodes_out.append(node)
 
-    for old_u in all_idx:
-        new_u = mapping[old_u]
-        for old_v in neighbors[old_u]:
-            new_v = mapping[old_v]
-            if new_v == new_u:
-                continue
-            conn_sets[new_u].add(new_v)
+    return nodes_out
 
-    for new_id, nbrs in conn_sets.items():
-        nodes_out[new_id - 1]["connected_to"] = sorted(nbrs)
 
-    return nodes_out
+def clean_graph(json_nodes, params=None, start=None, end=None):
+    p = resolve_params(params)
+    if CLEAN_JOBS <= 1:
+        return _clean_graph(json_nodes, p, start, end)
+    with ProcessPoolExecutor(max_workers=CLEAN_JOBS) as pool:
+        return _clean_graph(json_nodes, p, start, end, pool)
 
 
-def clean_graph(json_nodes):
-    coords, neighbors = json_to_internal(json_nodes)
-    coords, neighbors = merge_close_nodes(coords, neighbors, MERGE_DIST_M)
-    neighbors = connect_close_nodes(coords, neighbors, CONNECT_DIST_M)
-    neighbors = connect_components(coords, neighbors, COMPONENT_LINK_MAX_DIST)
-    neighbors = split_edges_by_near_nodes(coords, neighbors, NEAR_LINE_DIST_M)
-    neighbors = prune_skip_edges(
-        coords,
-        neighbors,
-        SKIP_MAX_EXTRA_RATIO,
-        SKIP_MAX_PERP_DIST_M,
+def _clean_graph(json_nodes, p, start, end, pool=None):
+    connect, split, prune = connect_close_nodes, split_edges_by_near_nodes, prune_skip_edges
+    prune_name, prune_args = "prune_skip_edges", (
+        p["skip_max_extra_ratio"],
+        p["skip_max_perp_dist_m"],
     )
-    json_clean = internal_to_json(coords, neighbors)
+    if pool is not None:
+        # Tiled connect/split give the serial result, so they share its
+        # checkpoints; tiled prune does not, so its key includes the tile size
+        connect = partial(tiled_connect_close_nodes, tile_m=CLEAN_TILE_M, pool=pool)
+        split = partial(tiled_split_edges_by_near_nodes, tile_m=CLEAN_TILE_M, pool=pool)
+        prune = partial(tiled_prune_skip_edges, pool=pool)
+        prune_name, prune_args = "prune_skip_edges_tiled", prune_args + (CLEAN_TILE_M,)
+
+    graph = run_passes_cached(json_nodes, [
+        ("merge_close_nodes", merge_close_nodes, (p["merge_dist_m"],)),
+        ("connect_close_nodes", connect, (p["connect_dist_m"],)),
+        ("connect_components", connect_components, (p["component_link_max_dist"],)),
+        ("split_edges_by_near_nodes", split, (p["near_line_dist_m"],)),
+        (prune_name, prune, prune_args),
+    ])
+    with profile_stage("internal_to_json"):
+        json_clean = internal_to_json(graph, start, end)
     return json_clean
 
 
+# =============== TILED CLEANING ===============
+# With CLEAN_JOBS > 1 the local passes run on square tiles of CLEAN_TILE_M
+# across a process pool. A tile is its core nodes plus a halo wide enough
+# for the pass to see everything it would see on the whole graph; the
+# ordinary pass function runs on it and the edges come back to be unioned
+# in tile order, so the result does not depend on scheduling.
+#
+# connect_close_nodes and split_edges_by_near_nodes only ever look within a
+# fixed radius, so their tiled output equals the serial one. merge_close_nodes
+# (transitive groups) and connect_components (global) stay serial.
+# prune_skip_edges removes edges one at a time, each decision depending on
+# earlier removals nearby, so it runs in four checkerboard phases instead:
+# tiles in the same phase are a full tile apart and cannot see each other's
+# edits. Every removal still has its detour in place, but the visiting order
+# differs from the serial pass, so a few different edges may survive.
+
+def tile_cores(xs, ys, tile_m):
+    """{(cx, cy): sorted core nodes} for the non-empty tile_m squares."""
+    cells = {}
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        cells.setdefault((math.floor(x / tile_m), math.floor(y / tile_m)), []).append(i)
+    return cells
+
+
+def _run_tile(name, data, args, owners=None):
+    graph = graph_from_bytes(data)
+    if owners is not None:
+        graph = TILE_PASSES[name](graph, *args, owners=owners)
+    else:
+        graph = TILE_PASSES[name](graph, *args)
+    us, vs = graph.edge_arrays()
+    return us.tobytes(), vs.tobytes()
+
+
+def run_tiled(graph, name, args, halo_m, tile_m, pool=None, edges="owned", phase=None):
+    """Run pass name on the tiles of graph and yield (core, us, vs).
+
+    core is the set of nodes the tile owns and us/vs its output edges as
+    global indices. edges picks what the tile holds besides its nodes:
+    "owned" is every edge whose lower endpoint is in the core (plus the
+    other endpoint), "induced" every edge among the tile's nodes, None no
+    edges. With "induced" only owned edges may be removed. phase, if
+    given, restricts the run to tiles whose (cx % 2, cy % 2) equals it.
+    """
+    graph.compact()
+    xs, ys = graph.xy()
+    cells = tile_cores(xs, ys, tile_m)
+    keys = sorted(k for k in cells if phase is None or (k[0] % 2, k[1] % 2) == phase)
+    if not keys:
+        return
+    index = build_grid_index(xs, ys, tile_m) if halo_m > 0 else None
+    tile_of = {}
+    for t, key in enumerate(keys):
+        for u in cells[key]:
+            tile_of[u] = t
+
+    owned = [(array("i"), array("i")) for _ in keys]
+    if edges == "owned":
+        for u, v in zip(*graph.edge_arrays()):
+            t = tile_of.get(u)
+            if t is not None:
+                owned[t][0].append(u)
+                owned[t][1].append(v)
+
+    cores, tasks, owners = [], [], []
+    for key, (t_us, t_vs) in zip(keys, owned):
+        core = cells[key]
+        x0, y0 = key[0] * tile_m - halo_m, key[1] * tile_m - halo_m
+        x1, y1 = x0 + tile_m + 2 * halo_m, y0 + tile_m + 2 * halo_m
+        nodes = set(core)
+        nodes.update(t_vs)
+        if index is not None:
+            nodes.update(
+                w for w in grid_query_box(index, x0, x1, y0, y1)
+                if x0 <= xs[w] <= x1 and y0 <= ys[w] <= y1
+            )
+        nodes = sorted(nodes)
+        local = {u: k for k, u in enumerate(nodes)}
+        if edges == "induced":
+            t_us, t_vs = array("i"), array("i")
+            for u in nodes:
+                for v in graph.neighbors(u):
+                    if u < v and v in local:
+                        t_us.append(u)
+                        t_vs.append(v)
+            core_set = set(core)
+            owners.append(bytes(u in core_set for u in nodes))
+        else:
+            owners.append(None)
+        piece = CompactGraph.from_pairs(
+            [graph.lat[u] for u in nodes], [graph.lon[u] for u in nodes],
+            [local[u] for u in t_us], [local[v] for v in t_vs], graph.proj,
+        )
+        cores.append((nodes, set(core)))
+        tasks.append(graph_to_bytes(piece))
+    profile_count("clean_tiles", len(tasks))
+
+    names, argss = [name] * len(tasks), [args] * len(tasks)
+    if pool is not None:
+        results = pool.map(_run_tile, names, tasks, argss, owners)
+    else:
+        results = map(_run_tile, names, tasks, argss, owners)
+    for (nodes, core), (us_b, vs_b) in zip(cores, results):
+        l_us, l_vs = array("i"), array("i")
+        l_us.frombytes(us_b)
+        l_vs.frombytes(vs_b)
+        yield core, [nodes[a] for a in l_us], [nodes[b] for b in l_vs]
+
+
+def tiled_connect_close_nodes(graph, connect_dist_m, tile_m=None, pool=None):
+    """connect_close_nodes over tiles with a connect_dist_m halo."""
+    tile_m = tile_m or CLEAN_TILE_M
+    graph.compact()
+    us, vs = graph.edge_arrays()
+    for core, t_us, t_vs in run_tiled(
+        graph, "connect_close_nodes", (connect_dist_m,), connect_dist_m, tile_m, pool,
+        edges=None,
+    ):
+        # Each pair is kept by the tile owning its lower endpoint
+        for u, v in zip(t_us, t_vs):
+            if u in core:
+                us.append(u)
+                vs.append(v)
+    return CompactGraph.from_pairs(graph.lat, graph.lon, us, vs, graph.proj)
+
+
+def max_edge_extent(graph):
+    """Largest x or y extent (m) of any edge, how far an edge reaches past its tile."""
+    xs, ys = graph.xy()
+    return max(
+        (max(abs(xs[u] - xs[v]), abs(ys[u] - ys[v])) for u, v in zip(*graph.edge_arrays())),
+        default=0.0,
+    )
+
+
+def tiled_split_edges_by_near_nodes(graph, near_line_dist_m, tile_m=None, pool=None):
+    """split_edges_by_near_nodes over tiles; an owned edge reaches its
+    extent past the tile and the pass looks near_line_dist_m past that."""
+    tile_m = tile_m or CLEAN_TILE_M
+    graph.compact()
+    us, vs = graph.edge_arrays()
+    halo = max_edge_extent(graph) + near_line_dist_m
+    for _, t_us, t_vs in run_tiled(
+        graph, "split_edges_by_near_nodes", (near_line_dist_m,), halo, tile_m, pool,
+    ):
+        us.extend(t_us)
+        vs.extend(t_vs)
+    return CompactGraph.from_pairs(graph.lat, graph.lon, us, vs, graph.proj)
+
+
+def tiled_prune_skip_edges(graph, max_extra_ratio, max_perp_dist_m, tile_m=None, pool=None):
+    """prune_skip_edges in four checkerboard phases of tiles (see above).
+
+    A detour search from an owned edge stays within (1 + max_extra_ratio)
+    times the longest edge of it, which is the halo. Tiles are grown if
+    needed so the halo plus an edge length fits in the one-tile gap
+    between tiles of the same phase.
+    """
+    graph.compact()
+    extent = max_edge_extent(graph)
+    halo = extent * math.sqrt(2) * (1 + max_extra_ratio)
+    tile_m = max(tile_m or CLEAN_TILE_M, halo + extent * math.sqrt(2) + 1.0)
+    for phase in ((0, 0), (1, 0), (0, 1), (1, 1)):
+        removed_u, removed_v = array("i"), array("i")
+        for core, t_us, t_vs in run_tiled(
+            graph, "prune_skip_edges", (max_extra_ratio, max_perp_dist_m), halo, tile_m, pool,
+            edges="induced", phase=phase,
+        ):
+            kept = set(zip(t_us, t_vs))
+            for u in sorted(core):
+                for v in graph.neighbors(u):
+                    if u < v and (u, v) not in kept:
+                        removed_u.append(u)
+                        removed_v.append(v)
+        for u, v in zip(removed_u, removed_v):
+            graph.remove_edge(u, v)
+        graph.compact()
+    return graph
+
+
+TILE_PASSES = {
+    "connect_close_nodes": connect_close_nodes,
+    "split_edges_by_near_nodes": split_edges_by_near_nodes,
+    "prune_skip_edges": prune_skip_edges,
+}
+
+
+# =============== INCREMENTAL UPDATE ===============
+
+def subgraph(graph, nodes):
+    """Induced subgraph on sorted node indices; sub node k is nodes[k]."""
+    local = {u: k for k, u in enumerate(nodes)}
+    us, vs = array("i"), array("i")
+    for k, u in enumerate(nodes):
+        for v in graph.neighbors(u):
+            j = local.get(v)
+            if j is not None and k < j:
+                us.append(k)
+                vs.append(j)
+    return CompactGraph.from_pairs(
+        [graph.lat[u] for u in nodes], [graph.lon[u] for u in nodes], us, vs, graph.proj
+    )
+
+
+def replace_subgraph(graph, nodes, sub):
+    """graph with the edges among nodes replaced by the edges of sub."""
+    inside = set(nodes)
+    us, vs = array("i"), array("i")
+    for u, v in graph.edges():
+        if u not in inside or v not in inside:
+            us.append(u)
+            vs.append(v)
+    for a, b in sub.edges():
+        us.append(nodes[a])
+        vs.append(nodes[b])
+    return CompactGraph.from_pairs(graph.lat, graph.lon, us, vs, graph.proj)
+
+
+def extend_region(graph, touched, reach_m, near_line_dist_m, new_edges=()):
+    """Sorted nodes a cleaning pass could change when touched nodes are added.
+
+    That is every node within reach_m of a touched node, plus both ends of
+    any edge whose bounding box (padded by near_line_dist_m) holds one, so
+    split_edges_by_near_nodes sees every edge a new node could split. Nodes
+    in the padded bounding box of a new edge are added too: a long new edge
+    can pass close to an existing node far from either of its ends.
+    """
+    xs, ys = graph.xy()
+    t_x = [xs[u] for u in touched]
+    t_y = [ys[u] for u in touched]
+    index = build_grid_index(t_x, t_y, reach_m)
+    region = set(touched)
+    for u in range(len(graph)):
+        x1, y1 = xs[u], ys[u]
+        for k in grid_query(index, x1, y1, reach_m):
+            if math.hypot(t_x[k] - x1, t_y[k] - y1) <= reach_m:
+                region.add(u)
+                break
+
+    pad = near_line_dist_m
+    for u, v in graph.edges():
+        if u in region and v in region:
+            continue
+        hit = next(grid_query_box(
+            index,
+            min(xs[u], xs[v]) - pad,
+            max(xs[u], xs[v]) + pad,
+            min(ys[u], ys[v]) - pad,
+            max(ys[u], ys[v]) + pad,
+        ), None)
+        if hit is not None:
+            region.update((u, v))
+
+    nodes = build_grid_index(xs, ys, 2 * pad)
+    for u, v in new_edges:
+        region.update(grid_query_box(
+            nodes,
+            min(xs[u], xs[v]) - pad,
+            max(xs[u], xs[v]) + pad,
+            min(ys[u], ys[v]) - pad,
+            max(ys[u], ys[v]) + pad,
+        ))
+
+    return sorted(region)
+
+
+def extend_graph(json_nodes, routes, params=None):
+    """Add polylines to an already cleaned graph, re-cleaning only near them.
+
+    New nodes within merge_dist_m of an existing node snap onto it; existing
+    nodes never move. The connect, split and prune passes then run on the
+    subgraph around the new geometry only (see extend_region), and
+    connect_components once over the whole graph, which is grid-bounded.
+
+    Existing ids 1..N-1 are kept and new nodes take ids from N on. The
+    destination stays the last node, as the app expects, so it is the one
+    existing node whose id changes (to the new node count).
+    """
+    p = resolve_params(params)
+    if not json_nodes:
+        return clean_graph(build_graph_from_routes(routes), p)
+
+    with profile_stage("json_to_internal"):
+        base = json_to_internal(json_nodes)
+        added = json_to_internal(build_graph_from_routes(routes), base.proj)
+    added = run_pass("merge_close_nodes", merge_close_nodes, added, p["merge_dist_m"])
+    n_old = len(base)
+
+    with profile_stage("snap_new_nodes"):
+        merge = p["merge_dist_m"]
+        base_x, base_y = base.xy()
+        index = build_grid_index(base_x, base_y, merge)
+        lat, lon = array("d", base.lat), array("d", base.lon)
+        target = array("i")
+        for lat1, lon1, x1, y1 in zip(added.lat, added.lon, *added.xy()):
+            best, best_d = -1, merge
+            for j in grid_query(index, x1, y1, merge):
+                d = math.hypot(base_x[j] - x1, base_y[j] - y1)
+                if d < best_d or (d == best_d and best < 0):
+                    best, best_d = j, d
+            if best < 0:
+                best = len(lat)
+                lat.append(lat1)
+                lon.append(lon1)
+            target.append(best)
+
+        us, vs = base.edge_arrays()
+        add_u, add_v = added.edge_arrays()
+        us.extend(target[u] for u in add_u)
+        vs.extend(target[v] for v in add_v)
+        graph = CompactGraph.from_pairs(lat, lon, us, vs, base.proj)
+
+    with profile_stage("extend_region"):
+        reach = max(
+            p["merge_dist_m"], p["connect_dist_m"],
+            p["near_line_dist_m"], p["component_link_max_dist"],
+        )
+        region = extend_region(
+            graph, sorted(set(target)), reach, p["near_line_dist_m"],
+            zip((target[u] for u in add_u), (target[v] for v in add_v)),
+        )
+    profile_count("extend_region_nodes", len(region))
+
+    sub = run_pass(
+        "connect_close_nodes", connect_close_nodes, subgraph(graph, region),
+        p["connect_dist_m"],
+    )
+    graph = replace_subgraph(graph, region, sub)
+    graph = run_pass(
+        "connect_components", connect_components, graph, p["component_link_max_dist"]
+    )
+    sub = run_pass(
+        "split_edges_by_near_nodes", split_edges_by_near_nodes, subgraph(graph, region),
+        p["near_line_dist_m"],
+    )
+    sub = run_pass(
+        "prune_skip_edges", prune_skip_edges, sub,
+        p["skip_max_extra_ratio"],
+        p["skip_max_perp_dist_m"],
+    )
+    graph = replace_subgraph(graph, region, sub)
+
+    n = len(graph)
+    with profile_stage("internal_to_json"):
+        ordered = list(range(n_old - 1)) + list(range(n_old, n)) + [n_old - 1]
+        return ordered_to_json(graph, ordered, n_old - 1)
+
+
+def load_polylines(path):
+    """Yield polylines as [(lon, lat), ...] from GeoJSON or a plain JSON list.
+
+    GeoJSON may be a FeatureCollection, Feature or bare geometry; LineString
+    and MultiLineString geometries are used, everything else is skipped.
+    The file is streamed, one feature or line at a time.
+    """
+    with open(path, "rb") as f:
+        chunks = iter_text_chunks(f)
+        buf, pos = seek_json_array(chunks, ("features",))
+        if pos is not None and buf.lstrip().startswith("["):
+            for line in iter_json_array(chunks, buf, pos):
+                yield [(float(x), float(y)) for x, y, *_ in line]
+            return
+        features = (
+            iter_json_array(chunks, buf, pos) if pos is not None
+            else iter_geojson_features([buf])
+        )
+        for feature in features:
+            yield from feature_lines(feature)
+
+
+# =============== LOCAL ROUTER ===============
+# Answers ors_route queries from a walking network on disk (GeoJSON
+# LineStrings, e.g. footways exported from OSM) with length-weighted A*, so
+# connectors cost milliseconds instead of an ORS round-trip.
+
+LOCAL_COORD_DIGITS = 7   # line vertices equal to this many decimals become one node
+_LOCAL_ROUTER = None
+_LOCAL_ROUTER_LOCK = threading.Lock()
+
+
+class LocalRouter:
+    """Walking network as a CompactGraph plus a grid for snapping queries.
+
+    Lines are joined wherever they share a vertex, as OSM ways share nodes,
+    and segments are split every densify_m metres so any point within about
+    snap_dist_m of a line has a node to snap to.
+    """
+
+    __slots__ = ("graph", "slot_len", "grid", "snap_dist_m")
+
+    def __init__(self, lines, snap_dist_m=LOCAL_SNAP_MAX_DIST_M, densify_m=LOCAL_DENSIFY_M):
+        ids = {}
+        lat, lon = array("d"), array("d")
+        us, vs = array("i"), array("i")
+
+        def node(x, y):
+            key = (round(x, LOCAL_COORD_DIGITS), round(y, LOCAL_COORD_DIGITS))
+            u = ids.get(key)
+            if u is None:
+                u = ids[key] = len(lat)
+                lon.append(x)
+                lat.append(y)
+            return u
+
+        for line in lines:
+            prev = None
+            for i, (x, y) in enumerate(line):
+                if i:
+                    x0, y0 = line[i - 1]
+                    steps = math.ceil(haversine_m(y0, x0, y, x) / densify_m)
+                    for k in range(1, steps):
+                        t = k / steps
+                        u = node(x0 + (x - x0) * t, y0 + (y - y0) * t)
+                        if u != prev:
+                            us.append(prev)
+                            vs.append(u)
+                        prev = u
+                u = node(x, y)
+                if prev is not None and u != prev:
+                    us.append(prev)
+                    vs.append(u)
+                prev = u
+
+        self.graph = CompactGraph.from_pairs(
+            lat, lon, us, vs, LocalProjection.around(lat, lon)
+        )
+        self.slot_len = self.graph.slot_lengths()
+        xs, ys = self.graph.xy()
+        self.grid = build_grid_index(xs, ys, snap_dist_m)
+        self.snap_dist_m = snap_dist_m
+
+    @classmethod
+    def from_file(cls, path, snap_dist_m=LOCAL_SNAP_MAX_DIST_M, densify_m=LOCAL_DENSIFY_M):
+        return cls(load_polylines(path), snap_dist_m, densify_m)
+
+    def snap(self, lon, lat):
+        """Index of the nearest network node within snap_dist_m, or None."""
+        xs, ys = self.graph.xy()
+        px, py = self.graph.proj.forward([lat], [lon])
+        px, py = px[0], py[0]
+        best, best_d = None, self.snap_dist_m
+        for i in grid_query(self.grid, px, py, self.snap_dist_m):
+            d = math.hypot(xs[i] - px, ys[i] - py)
+            if d <= best_d:
+                best, best_d = i, d
+        return best
+
+    def route(self, start_lon, start_lat, end_lon, end_lat):
+        """Shortest walking path in ors_route's shape: a list holding one
+        [[lon, lat], ...] route, or an empty list if either end is off the
+        network or they are not connected."""
+        start = self.snap(start_lon, start_lat)
+        end = self.snap(end_lon, end_lat)
+        if start is None or end is None:
+            return []
+        path, _ = shortest_path_bounded(
+            self.graph, self.slot_len, start, end, float("inf"),
+            counter="local_route_expansions",
+        )
+        if path is None:
+            return []
+        return [[[self.graph.lon[u], self.graph.lat[u]] for u in path]]
+
+    def distances(self, lon, lat, targets):
+        """Walking distance (m) from one point to each [lon, lat] target.
+
+        Dijkstra from the snapped source, stopping once every snapped
+        target is settled; None for points off the network or unreachable.
+        """
+        start = self.snap(lon, lat)
+        nodes = [self.snap(t_lon, t_lat) for t_lon, t_lat in targets]
+        if start is None:
+            return [None] * len(targets)
+        offsets, indices, slot_len = self.graph.offsets, self.graph.indices, self.slot_len
+        pending = {u for u in nodes if u is not None}
+        dist = {start: 0.0}
+        heap = [(0.0, start)]
+        while heap and pending:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            pending.discard(u)
+            for k in range(offsets[u], offsets[u + 1]):
+                v = indices[k]
+                nd = d + slot_len[k]
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return [None if u is None or u in pending else dist[u] for u in nodes]
+
+    def matrix(self, locations, sources, destinations):
+        """Local stand-in for ors_matrix, same arguments and result shape."""
+        targets = [locations[j] for j in destinations]
+        return [self.distances(*locations[i], targets) for i in sources]
+
+
+def local_router():
+    """The LocalRouter for LOCAL_NETWORK_PATH, loaded on first use; None if unset."""
+    global _LOCAL_ROUTER
+    if not LOCAL_NETWORK_PATH:
+        return None
+    with _LOCAL_ROUTER_LOCK:
+        if _LOCAL_ROUTER is None or _LOCAL_ROUTER[0] != LOCAL_NETWORK_PATH:
+            with profile_stage("local_network_load"):
+                router = LocalRouter.from_file(LOCAL_NETWORK_PATH)
+            _LOCAL_ROUTER = (LOCAL_NETWORK_PATH, router)
+        return _LOCAL_ROUTER[1]
+
+
+def route_many(queries):
+    """ors_route_many, answered by the local router when one is configured."""
+    router = local_router()
+    if router is None:
+        return ors_route_many(queries)
+    return [router.route(*query) for query in queries]
+
+
+def walk_matrix(locations, sources, destinations):
+    """ors_matrix, answered by the local router when one is configured."""
+    router = local_router()
+    if router is None:
+        return ors_matrix(locations, sources, destinations)
+    return router.matrix(locations, sources, destinations)
+
+
 # =============== KML FROM CLEANED JSON ===============
 
-def build_kml_from_json(json_nodes):
-    node_placemarks = []
+KML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <name>Cleaned Route Graph</name>
+    <Style id="edge">
+      <LineStyle>
+        <color>ff0000ff</color>
+        <width>3</width>
+      </LineStyle>
+    </Style>
+"""
+
+KML_FOOTER = """  </Document>
+</kml>
+"""
+
+
+def kml_edge_chains(json_nodes, coalesce=True):
+    """Yield each edge once as a list of node ids.
+
+    With coalesce, runs through degree-2 nodes are merged so every yielded
+    list is a maximal polyline between junctions or dead ends; loops made
+    only of degree-2 nodes come out closed (first id == last id).
+    """
+    adj = {
+        node["id"]: [v for v in node.get("connected_to", []) if v != node["id"]]
+        for node in json_nodes
+    }
+    seen = set()
+
+    def walk(u, v):
+        chain = [u, v]
+        seen.add((u, v) if u < v else (v, u))
+        prev, cur = u, v
+        while coalesce and len(adj.get(cur, ())) == 2:
+            a, b = adj[cur]
+            nxt = b if a == prev else a
+            key = (cur, nxt) if cur < nxt else (nxt, cur)
+            if key in seen:
+                break
+            seen.add(key)
+            chain.append(nxt)
+            prev, cur = cur, nxt
+        return chain
+
+    # Start at junctions and dead ends first so chains run between them
     for node in json_nodes:
-        nid = node["id"]
-        lat = node["lat"]
-        lon = node["lon"]
-        node_placemarks.append(f"""
-      <Placemark>
-        <name>{nid}</name>
-        <Point>
-          <coordinates>{lon},{lat},0</coordinates>
-        </Point>
-      </Placemark>""")
-
-    edge_seen = set()
-    edge_placemarks = []
+        u = node["id"]
+        if coalesce and len(adj[u]) == 2:
+            continue
+        for v in adj[u]:
+            if ((u, v) if u < v else (v, u)) not in seen:
+                yield walk(u, v)
+
     for node in json_nodes:
         u = node["id"]
-        lat_u = node["lat"]
-        lon_u = node["lon"]
+        for v in adj[u]:
+            if ((u, v) if u < v else (v, u)) not in seen:
+                yield walk(u, v)
+
+
+def write_kml(json_nodes, out, coalesce=True):
+    """Stream the graph as KML into a text file object, one Placemark at a time."""
+    out.write(KML_HEADER)
+
+    out.write("    <Folder>\n      <name>Nodes</name>\n")
+    for node in json_nodes:
+        out.write(
+            "      <Placemark>\n"
+            f"        <name>{node['id']}</name>\n"
+            f"        <Point><coordinates>{node['lon']},{node['lat']},0</coordinates></Point>\n"
+            "      </Placemark>\n"
+        )
+    out.write("    </Folder>\n")
+
+    pos = {node["id"]: (node["lon"], node["lat"]) for node in json_nodes}
+    out.write("    <Folder>\n      <name>Edges</name>\n")
+    for chain in kml_edge_chains(json_nodes, coalesce):
+        coords = " ".join(f"{pos[i][0]},{pos[i][1]},0" for i in chain if i in pos)
+        out.write(
+            "      <Placemark>\n"
+            f"        <name>{chain[0]}-{chain[-1]}</name>\n"
+            "        <styleUrl>#edge</styleUrl>\n"
+            "        <LineString>\n"
+            "          <tessellate>1</tessellate>\n"
+            f"          <coordinates>{coords}</coordinates>\n"
+            "        </LineString>\n"
+            "      </Placemark>\n"
+        )
+    out.write("    </Folder>\n")
+
+    out.write(KML_FOOTER)
+
+
+def write_kml_file(json_nodes, path, coalesce=True):
+    """Write KML to path, or zipped KMZ (doc.kml inside) if path ends in .kmz."""
+    if path.lower().endswith(".kmz"):
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open("doc.kml", "w") as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8") as f:
+                    write_kml(json_nodes, f, coalesce)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            write_kml(json_nodes, f, coalesce)
+
+
+def build_kml_from_json(json_nodes, coalesce=True):
+    buf = io.StringIO()
+    write_kml(json_nodes, buf, coalesce)
+    return buf.getvalue()
+
+
+# =============== BINARY GRAPH FORMAT ===============
+
+# Compact alternative to route.json. Little-endian, every section 4-byte
+# aligned so a reader can map typed-array views straight onto the buffer:
+#
+#   header   magic "AIDG", u16 version, u16 flags, u32 node_count N,
+#            u32 index_count M, u32 coord_scale (units per degree)
+#   lat      i32[N]    fixed-point latitude  (degrees * coord_scale)
+#   lon      i32[N]    fixed-point longitude
+#   offsets  u32[N+1]  CSR row starts into indices
+#   indices  u32[M]    neighbour node indices (node id = index + 1)
+#
+# At the default scale of 1e7 coordinates round to about 1 cm.
+GRAPH_BIN_MAGIC = b"AIDG"
+GRAPH_BIN_VERSION = 1
+GRAPH_BIN_HEADER = struct.Struct("<4sHHIII")
+GRAPH_BIN_SCALE = 10_000_000
+
+
+def _le_array(typecode, values=()):
+    arr = array(typecode, values)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+def write_graph_bin(json_nodes, path, scale=GRAPH_BIN_SCALE):
+    """Write cleaned JSON nodes (ids 1..N in order) in the binary CSR format."""
+    n = len(json_nodes)
+    lat = array("i")
+    lon = array("i")
+    offsets = array("I", [0])
+    indices = array("I")
+    for k, node in enumerate(json_nodes):
+        if node["id"] != k + 1:
+            raise ValueError(f"Node ids must run 1..N in order, got {node['id']} at {k + 1}")
+        lat.append(round(node["lat"] * scale))
+        lon.append(round(node["lon"] * scale))
         for v in node.get("connected_to", []):
-            if u == v:
-                continue
-            a, b = sorted((u, v))
-            if (a, b) in edge_seen:
-                continue
-            edge_seen.add((a, b))
-            node_v = json_nodes[b - 1]
-            lat_v = node_v["lat"]
-            lon_v = node_v["lon"]
-            edge_placemarks.append(f"""
-      <Placemark>
-        <Style>
-          <LineStyle>
-            <color>ff0000ff</color>
-            <width>3</width>
-          </LineStyle>
-        </Style>
-        <LineString>
-          <tessellate>1</tessellate>
-          <coordinates>
-            {lon_u},{lat_u},0
-            {lon_v},{lat_v},0
-          </coordinates>
-        </LineString>
-      </Placemark>""")
-
-    return f"""<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-  <Document>
-    <name>Cleaned Route Graph</name>
+            if not 1 <= v <= n:
+                raise ValueError(f"Node {node['id']} links to unknown node {v}")
+            indices.append(v - 1)
+        offsets.append(len(indices))
+
+    with open(path, "wb") as f:
+        f.write(GRAPH_BIN_HEADER.pack(
+            GRAPH_BIN_MAGIC, GRAPH_BIN_VERSION, 0, n, len(indices), scale
+        ))
+        for arr in (lat, lon, offsets, indices):
+            if sys.byteorder != "little":
+                arr.byteswap()
+            arr.tofile(f)
+
+
+def load_graph_bin(path):
+    """Read the binary format into flat arrays, without per-node objects.
+
+    Returns a dict with "lat"/"lon" (fixed-point i32 arrays), "offsets" and
+    "indices" (CSR, u32) and "scale"; node k's neighbours are
+    indices[offsets[k]:offsets[k + 1]].
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < GRAPH_BIN_HEADER.size:
+        raise ValueError(f"{path}: too short for a graph header")
+    magic, version, _flags, n, m, scale = GRAPH_BIN_HEADER.unpack_from(data)
+    if magic != GRAPH_BIN_MAGIC:
+        raise ValueError(f"{path}: not a binary route graph")
+    if version != GRAPH_BIN_VERSION:
+        raise ValueError(f"{path}: unsupported graph format version {version}")
+    expected = GRAPH_BIN_HEADER.size + 4 * (n + n + (n + 1) + m)
+    if len(data) != expected:
+        raise ValueError(f"{path}: expected {expected} bytes, found {len(data)}")
+
+    view = memoryview(data)
+    pos = GRAPH_BIN_HEADER.size
+    out = {"scale": scale}
+    for name, typecode, count in (
+        ("lat", "i", n),
+        ("lon", "i", n),
+        ("offsets", "I", n + 1),
+        ("indices", "I", m),
+    ):
+        out[name] = _le_array(typecode, view[pos:pos + 4 * count].cast(typecode))
+        pos += 4 * count
+    return out
+
+
+def read_graph_bin(path):
+    """Read the binary format back into route.json-style node dicts."""
+    g = load_graph_bin(path)
+    scale = g["scale"]
+    offsets = g["offsets"]
+    indices = g["indices"]
+    return [
+        {
+            "id": k + 1,
+            "lat": g["lat"][k] / scale,
+            "lon": g["lon"][k] / scale,
+            "connected_to": [v + 1 for v in indices[offsets[k]:offsets[k + 1]]],
+        }
+        for k in range(len(g["lat"]))
+    ]
 
-    <Folder>
-      <name>Nodes</name>
-      {''.join(node_placemarks)}
-    </Folder>
 
-    <Folder>
-      <name>Edges</name>
-      {''.join(edge_placemarks)}
-    </Folder>
-  </Document>
-</kml>"""
+def verify_graph_bin(json_nodes, path):
+    """Check that path reads back to json_nodes; returns the max coord error in degrees."""
+    back = read_graph_bin(path)
+    if len(back) != len(json_nodes):
+        raise ValueError(f"{path}: {len(back)} nodes read back, expected {len(json_nodes)}")
+    tol = 0.5 / load_graph_bin(path)["scale"] + 1e-12
+    max_err = 0.0
+    for a, b in zip(json_nodes, back):
+        err = max(abs(a["lat"] - b["lat"]), abs(a["lon"] - b["lon"]))
+        if a["id"] != b["id"] or list(a["connected_to"]) != b["connected_to"] or err > tol:
+            raise ValueError(f"{path}: node {a['id']} does not round-trip")
+        max_err = max(max_err, err)
+    return max_err
 
 
-# =============== MAIN LOGIC ===============
+# =============== SNAP INDEX ===============
+# Fixed lat/lon grid the app buckets nodes by (helpers/snapIndex.js uses
+# the same constants). A node's cell is [floor(lat / SNAP_CELL_DEG_LAT),
+# floor(lon / SNAP_CELL_DEG_LON)]: about 111 m x 100 m at the site's
+# latitude, so a 3x3 block of cells covers anything within ~100 m of a fix.
+
+SNAP_CELL_DEG_LAT = 0.001
+SNAP_CELL_DEG_LON = 0.0015
+
+
+def snap_cell(lat, lon):
+    return [math.floor(lat / SNAP_CELL_DEG_LAT), math.floor(lon / SNAP_CELL_DEG_LON)]
+
 
-def main():
-    print("Requesting main + alternative routes from ORS...")
-    base_routes_raw = ors_route(
-        START_LON,
-        START_LAT,
-        END_LON,
-        END_LAT,
-        alt_count=ALT_ROUTE_COUNT,
+def build_snap_index(json_nodes):
+    """Cells -> node ids from the embedded cells (or computed ones).
+
+    Returns {"cells": {(row, col): [ids]}, "rows": (min, max), "cols": (min, max)}.
+    """
+    cells = {}
+    for node in json_nodes:
+        row, col = node.get("cell") or snap_cell(node["lat"], node["lon"])
+        cells.setdefault((row, col), []).append(node["id"])
+    rows = [r for r, _ in cells] or [0]
+    cols = [c for _, c in cells] or [0]
+    return {"cells": cells, "rows": (min(rows), max(rows)), "cols": (min(cols), max(cols))}
+
+
+def snap_min_cell_m(max_abs_lat):
+    """Shortest cell side in metres at or below max_abs_lat."""
+    cos_lat = math.cos(math.radians(min(max_abs_lat, 89.9)))
+    return min(SNAP_CELL_DEG_LAT, SNAP_CELL_DEG_LON * cos_lat) * M_PER_DEG
+
+
+def snap_nearest(index, by_id, lat, lon, max_abs_lat):
+    """Nearest node (id, metres) to lat/lon, touching only nearby cells.
+
+    Searches rings of cells outward from the fix's cell and stops once the
+    next ring is further away than the best node found so far.
+    """
+    cells = index["cells"]
+    row, col = snap_cell(lat, lon)
+    side_m = snap_min_cell_m(max(max_abs_lat, abs(lat))) * 0.999
+    max_reach = max(
+        abs(row - index["rows"][0]), abs(row - index["rows"][1]),
+        abs(col - index["cols"][0]), abs(col - index["cols"][1]),
     )
+    best_id, best_d = None, math.inf
+    for reach in range(max_reach + 1):
+        for r in range(row - reach, row + reach + 1):
+            step = 1 if abs(r - row) == reach else 2 * reach
+            for c in range(col - reach, col + reach + 1, max(step, 1)):
+                for node_id in cells.get((r, c), ()):
+                    node = by_id[node_id]
+                    d = haversine_m(lat, lon, node["lat"], node["lon"])
+                    if d < best_d:
+                        best_id, best_d = node_id, d
+        # Anything outside this ring is at least reach cell sides away
+        if best_d <= reach * side_m:
+            break
+    return best_id, best_d
 
-    if not base_routes_raw:
-        print("No routes returned from ORS.")
-        return
 
-    print(f"Base routes received: {len(base_routes_raw)}")
+def verify_snap_index(json_nodes, samples=2000, seed=1):
+    """Check bucket lookups against a brute-force scan on random fixes.
 
-    base_routes = []
-    for i, coords in enumerate(base_routes_raw, start=1):
-        simp = simplify_route(
-            coords,
-            ANGLE_THRESHOLD_DEG,
-            MAX_SEGMENT_DIST_M,
+    Fixes are drawn over the graph's bounding box padded by 200 m. Returns
+    the number checked; raises ValueError on the first disagreement.
+    """
+    if not json_nodes:
+        return 0
+    for node in json_nodes:
+        if "cell" in node and list(node["cell"]) != snap_cell(node["lat"], node["lon"]):
+            raise ValueError(f"Node {node['id']} has cell {node['cell']}, expected "
+                             f"{snap_cell(node['lat'], node['lon'])}")
+    index = build_snap_index(json_nodes)
+    by_id = {node["id"]: node for node in json_nodes}
+    lats, lons = coord_arrays([(node["lat"], node["lon"]) for node in json_nodes])
+    max_abs_lat = max(abs(float(x)) for x in lats)
+    pad_lat = 200.0 / M_PER_DEG
+    pad_lon = pad_lat / max(math.cos(math.radians(min(max_abs_lat, 89.9))), 1e-6)
+    lat_lo, lat_hi = float(min(lats)) - pad_lat, float(max(lats)) + pad_lat
+    lon_lo, lon_hi = float(min(lons)) - pad_lon, float(max(lons)) + pad_lon
+    rnd = random.Random(seed)
+    for _ in range(samples):
+        lat = rnd.uniform(lat_lo, lat_hi)
+        lon = rnd.uniform(lon_lo, lon_hi)
+        got_id, got_d = snap_nearest(index, by_id, lat, lon, max_abs_lat)
+        k, want_d = nearest_index(lat, lon, lats, lons)
+        if got_d != want_d and abs(got_d - float(want_d)) > 1e-6:
+            raise ValueError(
+                f"Snap index returned node {got_id} ({got_d:.3f} m) for "
+                f"({lat:.6f}, {lon:.6f}), brute force found node "
+                f"{json_nodes[k]['id']} ({float(want_d):.3f} m)"
+            )
+    return samples
+
+
+# =============== CONNECTOR PLANNING ===============
+
+def route_chainage(route):
+    """Cumulative distance (m) along a (lon, lat) polyline at each point."""
+    lons = [pt[0] for pt in route]
+    lats = [pt[1] for pt in route]
+    out = [0.0]
+    for d in haversine_pairs(lats[:-1], lons[:-1], lats[1:], lons[1:]):
+        out.append(out[-1] + float(d))
+    return out
+
+
+def spaced_indices(count, last_idx):
+    """Up to count distinct interior indices spread evenly over 0..last_idx."""
+    out = []
+    for k in range(1, count + 1):
+        idx = round(k * last_idx / (count + 1))
+        if 0 < idx < last_idx and idx not in out:
+            out.append(idx)
+    return out
+
+
+def plan_connectors_nearest(base_routes, params=None, log=print):
+    """Connectors from fixed main-route indices to the straight-line closest
+    point of each alt route, as (alt_idx, main_idx, alt_point_idx,
+    straight_m, None) like plan_connectors_matrix with no walk known."""
+    p = resolve_params(params)
+    main_route = base_routes[0]
+    base_indices = spaced_indices(p["connectors_per_alt"], len(main_route) - 1)
+    log(f"Connector base indices on main route: {base_indices}")
+
+    plan = []
+    for alt_idx in range(1, len(base_routes)):
+        alt_route = base_routes[alt_idx]
+        for mi in base_indices:
+            ai, dist_m = find_closest_index(alt_route, *main_route[mi])
+            if dist_m <= p["max_connector_dist_m"]:
+                plan.append((alt_idx, mi, ai, dist_m, None))
+    return plan
+
+
+def plan_connectors_matrix(base_routes, params=None, log=print):
+    """Pick connectors by walking distance from one matrix request.
+
+    Candidate main-route points (connector_candidate_factor times as many
+    as connectors_per_alt) are the sources. The destinations are alt-route
+    points spread along each alt, plus each alt's closest point to every
+    source. Pairs further apart than max_connector_dist_m in a straight line
+    are left out before the request.
+
+    A connector is worth its walk in proportion to the detour it saves:
+    without it, switching routes at those points means walking back to the
+    shared start or on to the shared end. Per alt route the pairs with the
+    lowest walk / detour ratio are kept, at least half the even spacing
+    apart along the main route. Returns (alt_idx, main_idx, alt_point_idx,
+    straight_m, walk_m) tuples ordered by alt, then main index.
+    """
+    p = resolve_params(params)
+    per_alt = p["connectors_per_alt"]
+    main_route = base_routes[0]
+    main_idx = spaced_indices(per_alt * p["connector_candidate_factor"], len(main_route) - 1)
+    if not main_idx:
+        return []
+
+    main_lats, main_lons = coord_arrays([(main_route[i][1], main_route[i][0]) for i in main_idx])
+    candidates = []   # (alt_idx, alt_point_idx, straight-line distance row over main_idx)
+    for alt_idx in range(1, len(base_routes)):
+        alt_route = base_routes[alt_idx]
+        picks = set(spaced_indices(len(main_idx), len(alt_route) - 1))
+        for mi in main_idx:
+            ai, _ = find_closest_index(alt_route, *main_route[mi])
+            if 0 < ai < len(alt_route) - 1:
+                picks.add(ai)
+        picks = sorted(picks)
+        alt_lats, alt_lons = coord_arrays([(alt_route[i][1], alt_route[i][0]) for i in picks])
+        straight = haversine_matrix(alt_lats, alt_lons, main_lats, main_lons)
+        for ai, row in zip(picks, straight):
+            row = [float(d) for d in row]
+            if min(row) <= p["max_connector_dist_m"]:
+                candidates.append((alt_idx, ai, row))
+    if not candidates:
+        return []
+
+    locations = [main_route[i] for i in main_idx]
+    locations += [base_routes[alt_idx][ai] for alt_idx, ai, _ in candidates]
+    sources = list(range(len(main_idx)))
+    destinations = list(range(len(main_idx), len(locations)))
+    log(f"Connector matrix: {len(sources)} main x {len(destinations)} alt candidate points...")
+    with profile_stage("local_route" if LOCAL_NETWORK_PATH else "ors_matrix"):
+        walks = walk_matrix(locations, sources, destinations)
+
+    main_chain = route_chainage(main_route)
+    alt_chains = {}
+    scored = []
+    for d, (alt_idx, ai, straight) in enumerate(candidates):
+        if alt_idx not in alt_chains:
+            alt_chains[alt_idx] = route_chainage(base_routes[alt_idx])
+        alt_chain = alt_chains[alt_idx]
+        for s, mi in enumerate(main_idx):
+            walk = walks[s][d]
+            if walk is None or straight[s] > p["max_connector_dist_m"]:
+                continue
+            detour = min(
+                main_chain[mi] + alt_chain[ai],
+                (main_chain[-1] - main_chain[mi]) + (alt_chain[-1] - alt_chain[ai]),
+            )
+            if detour <= 0 or walk >= detour:
+                continue
+            scored.append((walk / detour, alt_idx, mi, ai, straight[s], float(walk)))
+
+    spacing = main_chain[-1] / (per_alt + 1) / 2
+    picked = {}
+    for _, alt_idx, mi, ai, straight_m, walk in sorted(scored):
+        taken = picked.setdefault(alt_idx, [])
+        if len(taken) >= per_alt:
+            continue
+        if any(abs(main_chain[mi] - main_chain[t[1]]) < spacing for t in taken):
+            continue
+        taken.append((alt_idx, mi, ai, straight_m, walk))
+    plan = sorted(c for taken in picked.values() for c in taken)
+    log(f"  picked {len(plan)} connectors from {len(scored)} pairs that save walking")
+    return plan
+
+
+def fetch_routes(start_lat, start_lon, end_lat, end_lon, params=None, log=print):
+    """Fetch and simplify the base routes plus ladder connectors for one pair.
+
+    Returns the list of simplified (lon, lat) polylines, base routes first.
+    """
+    p = resolve_params(params)
+
+    router = local_router()
+    if router is not None and LOCAL_ROUTE_BASE:
+        log(f"Routing base path on local network {LOCAL_NETWORK_PATH} (no alternatives)...")
+        with profile_stage("local_route"):
+            base_routes_raw = iter(router.route(start_lon, start_lat, end_lon, end_lat))
+    else:
+        log("Requesting main + alternative routes from ORS...")
+        base_routes_raw = ors_route_iter(
+            start_lon,
+            start_lat,
+            end_lon,
+            end_lat,
+            alt_count=p["alt_route_count"],
         )
+
+    # Each route is simplified as it streams in; the raw one is dropped
+    base_routes = []
+    while True:
+        with profile_stage("ors_fetch"):
+            coords = next(base_routes_raw, None)
+        if coords is None:
+            break
+        with profile_stage("simplify_route"):
+            simp = simplify_route(
+                coords,
+                p["simplify_tolerance_m"],
+                p["max_segment_dist_m"],
+            )
         if simp:
-            simp[0] = (START_LON, START_LAT)
-            simp[-1] = (END_LON, END_LAT)
+            simp[0] = (start_lon, start_lat)
+            simp[-1] = (end_lon, end_lat)
         base_routes.append(simp)
-        print(f"  Base route {i}: {len(coords)} pts -> {len(simp)} pts")
+        log(f"  Base route {len(base_routes)}: {len(coords)} pts -> {len(simp)} pts")
+
+    if not base_routes:
+        log("No routes returned from ORS.")
+        return []
+
+    log(f"Base routes received: {len(base_routes)}")
 
     ladder_routes = []
-    if len(base_routes) > 1 and CONNECTORS_PER_ALT > 0:
+    if len(base_routes) > 1 and p["connectors_per_alt"] > 0:
         main_route = base_routes[0]
-        last_idx = len(main_route) - 1
+        plan = None
+        if CONNECTOR_MATRIX:
+            # Planning is an optimisation; losing the matrix must not lose
+            # the base routes already fetched
+            try:
+                plan = plan_connectors_matrix(base_routes, p, log=log)
+            except RuntimeError as e:
+                log("Connector matrix ORS error, using nearest points instead:", e)
+        if plan is None:
+            plan = plan_connectors_nearest(base_routes, p, log=log)
+
+        # A walk of length L between points D apart strays at most
+        # sqrt(L^2 - D^2) / 2 from the chord, so when that is within the
+        # simplify tolerance (and the chord needs no intermediate points)
+        # the simplified connector is the chord itself and needs no request
+        connectors = []
+        straight = []
+        for alt_idx, mi, ai, straight_m, walk_m in plan:
+            m_lon, m_lat = main_route[mi]
+            a_lon, a_lat = base_routes[alt_idx][ai]
+            if (
+                walk_m is not None
+                and straight_m <= p["max_segment_dist_m"]
+                and math.sqrt(max(walk_m * walk_m - straight_m * straight_m, 0.0)) / 2
+                <= p["simplify_tolerance_m"]
+            ):
+                straight.append([(m_lon, m_lat), (a_lon, a_lat)])
+                continue
+            dist_m = straight_m if walk_m is None else walk_m
+            connectors.append((alt_idx, mi, ai, dist_m, (m_lon, m_lat, a_lon, a_lat)))
+        if straight:
+            log(f"{len(straight)} connectors are straight by walking distance, not fetched")
+            ladder_routes.extend(straight)
+
+        if router is not None:
+            log(f"Routing {len(connectors)} connectors on local network {LOCAL_NETWORK_PATH}...")
+        else:
+            log(
+                f"Fetching {len(connectors)} connectors "
+                f"({ORS_MAX_WORKERS} workers, {ORS_MAX_REQUESTS_PER_MIN or 'no'} req/min limit)..."
+            )
+        with profile_stage("local_route" if router is not None else "ors_fetch"):
+            results = route_many([c[4] for c in connectors])
+
+        last_alt = None
+        for (alt_idx, mi, ai, dist_m, query), conn_raw in zip(connectors, results):
+            m_lon, m_lat, a_lon, a_lat = query
+            if alt_idx != last_alt:
+                log(f"Building connectors to alt route {alt_idx + 1}...")
+                last_alt = alt_idx
+
+            if isinstance(conn_raw, RuntimeError):
+                log("   connector ORS error:", conn_raw)
+                continue
 
-        base_indices = []
-        for k in range(1, CONNECTORS_PER_ALT + 1):
-            idx = round(k * last_idx / (CONNECTORS_PER_ALT + 1))
-            if 0 < idx < last_idx:
-                base_indices.append(idx)
+            if not conn_raw:
+                continue
 
-        print(f"Connector base indices on main route: {base_indices}")
+            conn_coords = conn_raw[0]
+            with profile_stage("simplify_route"):
+                simp_conn = simplify_route(
+                    conn_coords,
+                    p["simplify_tolerance_m"],
+                    p["max_segment_dist_m"],
+                )
 
-        for alt_idx in range(1, len(base_routes)):
-            alt_route = base_routes[alt_idx]
-            print(f"Building connectors to alt route {alt_idx + 1}...")
+            if len(simp_conn) > 1:
+                simp_conn[0] = (m_lon, m_lat)
+                simp_conn[-1] = (a_lon, a_lat)
+                ladder_routes.append(simp_conn)
+                log(
+                    f"   connector main[{mi}] -> alt[{ai}] "
+                    f"({dist_m:.0f} m): {len(conn_coords)} -> {len(simp_conn)} pts"
+                )
 
-            for mi in base_indices:
-                m_lon, m_lat = main_route[mi]
-                ai, dist_m = find_closest_index(alt_route, m_lon, m_lat)
-                if dist_m > MAX_CONNECTOR_DIST_M:
-                    continue
+    log(f"Ladder routes created: {len(ladder_routes)}")
 
-                a_lon, a_lat = alt_route[ai]
+    return base_routes + ladder_routes
 
-                try:
-                    conn_raw = ors_route(m_lon, m_lat, a_lon, a_lat, alt_count=0)
-                except RuntimeError as e:
-                    print("   connector ORS error:", e)
-                    continue
 
-                if not conn_raw:
-                    continue
+def generate_route(start_lat, start_lon, end_lat, end_lon, params=None, log=print):
+    """Run fetch -> simplify -> build -> clean for one start/end pair.
+
+    Returns a dict with the cleaned JSON nodes (None if ORS found no route),
+    node/edge counts and per-step timings in seconds.
+    """
+    p = resolve_params(params)
+    result = {"nodes": None, "raw_nodes": 0, "clean_nodes": 0, "clean_edges": 0}
+
+    t0 = time.perf_counter()
+    all_routes = fetch_routes(start_lat, start_lon, end_lat, end_lon, p, log=log)
+    t1 = time.perf_counter()
+    result["fetch_s"] = t1 - t0
+    if not all_routes:
+        result["build_s"] = result["clean_s"] = 0.0
+        return result
+
+    log("Building merged JSON graph (raw)...")
+    with profile_stage("build_graph_from_routes"):
+        json_nodes_raw = build_graph_from_routes(all_routes)
+    log(f"  Raw graph nodes: {len(json_nodes_raw)}")
+    t2 = time.perf_counter()
+
+    log("Cleaning graph (merge/Connect/bridge/split/prune)...")
+    json_nodes_clean = clean_graph(
+        json_nodes_raw,
+        p,
+        start=(start_lat, start_lon),
+        end=(end_lat, end_lon),
+    )
+    log(f"  Clean graph nodes: {len(json_nodes_clean)}")
+    t3 = time.perf_counter()
+
+    result.update(
+        nodes=json_nodes_clean,
+        raw_nodes=len(json_nodes_raw),
+        clean_nodes=len(json_nodes_clean),
+        clean_edges=sum(len(n["connected_to"]) for n in json_nodes_clean) // 2,
+        build_s=t2 - t1,
+        clean_s=t3 - t2,
+    )
+    return result
+
+
+def write_outputs(json_nodes, json_path, kml_path, log=print):
+    log(f"Writing {json_path} ...")
+    with profile_stage("write_json"):
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(json_nodes, f, indent=2)
+
+    if WRITE_GRAPH_BIN:
+        bin_path = os.path.splitext(json_path)[0] + ".bin"
+        log(f"Writing {bin_path} ...")
+        with profile_stage("write_graph_bin"):
+            write_graph_bin(json_nodes, bin_path)
+            max_err = verify_graph_bin(json_nodes, bin_path)
+        log(
+            f"  {os.path.getsize(bin_path)} bytes vs {os.path.getsize(json_path)} JSON, "
+            f"round-trip ok (max coord error {max_err:.1e} deg)"
+        )
+
+    if EMBED_SNAP_INDEX:
+        with profile_stage("verify_snap_index"):
+            checked = verify_snap_index(json_nodes)
+        log(f"  Snap index matches brute-force nearest node on {checked} random fixes")
+
+    if KMZ_OUTPUT:
+        kml_path = os.path.splitext(kml_path)[0] + ".kmz"
+    log(f"Writing {kml_path} ...")
+    with profile_stage("write_kml"):
+        write_kml_file(json_nodes, kml_path, KML_COALESCE_CHAINS)
+
+
+def extend_route(json_path, routes_path, params=None, log=print):
+    """Load a cleaned route.json and add the polylines in routes_path to it.
+
+    Returns the same kind of dict as generate_route.
+    """
+    p = resolve_params(params)
+    t0 = time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as f:
+        json_nodes = json.load(f)
+    log(f"Extending {json_path} ({len(json_nodes)} nodes) with polylines from {routes_path}...")
+    count = [0]
+
+    def simplified():
+        # Features stream in and are simplified one at a time, so only the
+        # reduced polylines ever reach the graph builder
+        for line in load_polylines(routes_path):
+            with profile_stage("simplify_route"):
+                simp = simplify_route(line, p["simplify_tolerance_m"], p["max_segment_dist_m"])
+            if len(simp) > 1:
+                count[0] += 1
+                yield simp
+
+    t1 = time.perf_counter()
+    json_nodes_ext = extend_graph(json_nodes, simplified(), p)
+    t2 = time.perf_counter()
+    log(f"  Polylines added: {count[0]}")
+    log(f"  Extended graph nodes: {len(json_nodes_ext)}")
+    return {
+        "nodes": json_nodes_ext,
+        "raw_nodes": len(json_nodes),
+        "clean_nodes": len(json_nodes_ext),
+        "clean_edges": sum(len(n["connected_to"]) for n in json_nodes_ext) // 2,
+        "fetch_s": 0.0,
+        "build_s": t1 - t0,
+        "clean_s": t2 - t1,
+    }
 
-                conn_coords = conn_raw[0]
-                simp_conn = simplify_route(
-                    conn_coords,
-                    ANGLE_THRESHOLD_DEG,
-                    MAX_SEGMENT_DIST_M,
-                )
 
-                if len(simp_conn) > 1:
-                    simp_conn[0] = (m_lon, m_lat)
-                    simp_conn[-1] = (a_lon, a_lat)
-                    ladder_routes.append(simp_conn)
-                    print(
-                        f"   connector main[{mi}] -> alt[{ai}] "
-                        f"({dist_m:.0f} m): {len(conn_coords)} -> {len(simp_conn)} pts"
-                    )
+# =============== BATCH MODE ===============
+
+MANIFEST_COORD_FIELDS = ("start_lat", "start_lon", "end_lat", "end_lon")
+
+
+def load_manifest(path):
+    """Read batch entries from a .json or .csv manifest.
+
+    Every entry needs name, start_lat, start_lon, end_lat and end_lon. In a
+    JSON manifest (a list of objects) overrides go in an optional "params"
+    object; in a CSV any extra non-empty column is an override, named after
+    the lower-cased config constant (e.g. merge_dist_m).
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        raw_entries = []
+        for row in rows:
+            row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+            params = {
+                k: v for k, v in row.items()
+                if k != "name" and k not in MANIFEST_COORD_FIELDS and v != ""
+            }
+            raw_entries.append({**row, "params": params})
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            raw_entries = json.load(f)
+
+    entries = []
+    seen = set()
+    for i, raw in enumerate(raw_entries, start=1):
+        name = str(raw.get("name") or f"route-{i}")
+        safe = "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+        if safe in seen:
+            raise ValueError(f"Duplicate manifest entry name: {name}")
+        seen.add(safe)
+        try:
+            coords = {k: float(raw[k]) for k in MANIFEST_COORD_FIELDS}
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"Manifest entry {name!r} has bad coordinates: {e}") from e
+        try:
+            params = resolve_params(raw.get("params") or {})
+        except ValueError as e:
+            raise ValueError(f"Manifest entry {name!r} (row {i}): {e}") from e
+        entries.append({"name": safe, **coords, "params": params})
+    return entries
+
+
+def _batch_worker_init(settings):
+    # Workers may be spawned fresh, so carry over the CLI-level settings
+    globals().update(settings)
+
+
+def _run_batch_entry(entry, out_dir):
+    t0 = time.perf_counter()
+    row = {"name": entry["name"], "status": "ok"}
+    try:
+        result = generate_route(
+            entry["start_lat"],
+            entry["start_lon"],
+            entry["end_lat"],
+            entry["end_lon"],
+            entry["params"],
+            log=lambda *args: None,
+        )
+        if result["nodes"] is None:
+            row["status"] = "no route"
+        else:
+            write_outputs(
+                result["nodes"],
+                os.path.join(out_dir, entry["name"] + ".json"),
+                os.path.join(out_dir, entry["name"] + ".kml"),
+                log=lambda *args: None,
+            )
+        for key in ("raw_nodes", "clean_nodes", "clean_edges", "fetch_s", "build_s", "clean_s"):
+            row[key] = result[key]
+    except (RuntimeError, ValueError, OSError) as e:
+        row["status"] = f"error: {e}"
+    row["total_s"] = time.perf_counter() - t0
+    return row
+
+
+BATCH_SUMMARY_FIELDS = (
+    "name", "status", "raw_nodes", "clean_nodes", "clean_edges",
+    "fetch_s", "build_s", "clean_s", "total_s",
+)
+
+
+def run_batch(manifest_path, out_dir, jobs=None):
+    """Generate one JSON/KML pair per manifest entry across a process pool."""
+    entries = load_manifest(manifest_path)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(entries) or 1))
+
+    # The per-minute limit is per process, so split it across the pool
+    rpm = ORS_MAX_REQUESTS_PER_MIN / jobs if ORS_MAX_REQUESTS_PER_MIN else None
+    settings = {
+        "ORS_BASE_URL": ORS_BASE_URL,
+        "ORS_CACHE_DIR": ORS_CACHE_DIR,
+        "ORS_CACHE_TTL_S": ORS_CACHE_TTL_S,
+        "ORS_CACHE_MAX_BYTES": ORS_CACHE_MAX_BYTES,
+        "ORS_CACHE_ONLY": ORS_CACHE_ONLY,
+        "ORS_CACHE_ENABLED": ORS_CACHE_ENABLED,
+        "ORS_MAX_WORKERS": ORS_MAX_WORKERS,
+        "ORS_MAX_REQUESTS_PER_MIN": rpm,
+        "KMZ_OUTPUT": KMZ_OUTPUT,
+        "WRITE_GRAPH_BIN": WRITE_GRAPH_BIN,
+        "KML_COALESCE_CHAINS": KML_COALESCE_CHAINS,
+        "EMBED_NAV_TABLE": EMBED_NAV_TABLE,
+        "EMBED_SNAP_INDEX": EMBED_SNAP_INDEX,
+        "STAGE_CACHE_DIR": STAGE_CACHE_DIR,
+        "STAGE_CACHE_MAX_BYTES": STAGE_CACHE_MAX_BYTES,
+        "STAGE_CACHE_ENABLED": STAGE_CACHE_ENABLED,
+        "LOCAL_NETWORK_PATH": LOCAL_NETWORK_PATH,
+        "LOCAL_ROUTE_BASE": LOCAL_ROUTE_BASE,
+        "CONNECTOR_MATRIX": CONNECTOR_MATRIX,
+        "CLEAN_JOBS": 1,
+    }
 
-    print(f"Ladder routes created: {len(ladder_routes)}")
+    print(f"Batch: {len(entries)} routes from {manifest_path} on {jobs} processes...")
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_batch_worker_init,
+        initargs=(settings,),
+    ) as pool:
+        rows = list(pool.map(_run_batch_entry, entries, [out_dir] * len(entries)))
+    wall = time.perf_counter() - t0
+
+    summary_path = os.path.join(out_dir, "summary.csv")
+    with open(summary_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BATCH_SUMMARY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                k: (f"{v:.3f}" if isinstance(v, float) else v) for k, v in row.items()
+            })
+
+    print_summary_table(rows)
+    ok = sum(1 for r in rows if r["status"] == "ok")
+    print(f"{ok}/{len(rows)} routes written to {out_dir} in {wall:.1f} s ({summary_path})")
+    return rows
 
-    all_routes = base_routes + ladder_routes
 
-    print("Building merged JSON graph (raw)...")
-    json_nodes_raw = build_graph_from_routes(all_routes)
-    print(f"  Raw graph nodes: {len(json_nodes_raw)}")
+def print_summary_table(rows):
+    print_table(
+        rows,
+        ("name", "status", "raw", "clean", "edges", "fetch s", "clean s", "total s"),
+        ("name", "status", "raw_nodes", "clean_nodes", "clean_edges", "fetch_s", "clean_s", "total_s"),
+    )
 
-    print("Cleaning graph (merge/Connect/bridge/split/prune)...")
-    json_nodes_clean = clean_graph(json_nodes_raw)
-    print(f"  Clean graph nodes: {len(json_nodes_clean)}")
 
-    print(f"Writing {JSON_PATH} ...")
-    with open(JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(json_nodes_clean, f, indent=2)
+def print_table(rows, headers, keys):
+    table = [tuple(headers)]
+    for row in rows:
+        table.append(tuple(
+            f"{row[k]:.2f}" if isinstance(row.get(k), float) else str(row.get(k, "-"))
+            for k in keys
+        ))
+    widths = [max(len(r[i]) for r in table) for i in range(len(headers))]
+    for n, r in enumerate(table):
+        print("  ".join(cell.ljust(w) for cell, w in zip(r, widths)))
+        if n == 0:
+            print("  ".join("-" * w for w in widths))
+
+
+# =============== SWEEP MODE ===============
+
+SWEEP_PARAMS = (
+    "merge_dist_m", "connect_dist_m", "component_link_max_dist",
+    "near_line_dist_m", "skip_max_extra_ratio", "skip_max_perp_dist_m",
+)
+SWEEP_RESULT_FIELDS = (
+    "status", "raw_nodes", "clean_nodes", "clean_edges", "components",
+    "clean_s", "json_bytes",
+)
+_SWEEP_RAW = None
+
+
+def load_sweep_grid(path):
+    """Read {param: [values...]} and return the list of override dicts.
+
+    Only clean_graph parameters can be swept; a scalar counts as a single
+    value. Combinations are the full cross product in file order.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        grid = json.load(f)
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError(f"Sweep grid {path} must be a non-empty JSON object")
+    axes = []
+    for key, values in grid.items():
+        key = key.lower()
+        if key not in SWEEP_PARAMS:
+            raise ValueError(
+                f"Cannot sweep {key}; choose from {', '.join(SWEEP_PARAMS)}"
+            )
+        if not isinstance(values, list):
+            values = [values]
+        if not values:
+            raise ValueError(f"Sweep parameter {key} has no values")
+        axes.append([(key, v) for v in values])
+    combos = [dict(combo) for combo in product(*axes)]
+    for i, combo in enumerate(combos, start=1):
+        try:
+            resolve_params(combo)
+        except ValueError as e:
+            raise ValueError(f"Sweep grid {path}, combination {i} {combo}: {e}") from e
+    return combos
+
+
+def count_components(json_nodes):
+    """Number of connected components of a JSON node list (ids 1..N)."""
+    parent = list(range(len(json_nodes) + 1))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    components = len(json_nodes)
+    for node in json_nodes:
+        a = find(node["id"])
+        for other in node["connected_to"]:
+            b = find(other)
+            if a != b:
+                parent[b] = a
+                components -= 1
+    return components
+
+
+def _sweep_worker_init(settings, raw, start, end):
+    global _SWEEP_RAW
+    globals().update(settings)
+    _SWEEP_RAW = (raw, start, end)
+
+
+def _run_sweep_combo(combo):
+    raw, start, end = _SWEEP_RAW
+    row = {**combo, "status": "ok", "raw_nodes": len(raw)}
+    try:
+        t0 = time.perf_counter()
+        nodes = clean_graph(raw, combo, start=start, end=end)
+        row["clean_s"] = time.perf_counter() - t0
+        row["clean_nodes"] = len(nodes)
+        row["clean_edges"] = sum(len(n["connected_to"]) for n in nodes) // 2
+        row["components"] = count_components(nodes)
+        row["json_bytes"] = len(json.dumps(nodes, indent=2).encode("utf-8"))
+    except (RuntimeError, ValueError) as e:
+        row["status"] = f"error: {e}"
+    return row
+
+
+def sweep_raw_graph(raw_path, out_dir):
+    """The raw graph to sweep over, with the start/end to order it by.
+
+    Loads raw_path if given, otherwise fetches the configured start/end pair
+    (through the ORS cache) and saves the raw graph as raw.json in out_dir
+    so later sweeps can pass it back with --sweep-raw.
+    """
+    if raw_path:
+        with open(raw_path, "r", encoding="utf-8") as f:
+            return json.load(f), None, None
+    routes = fetch_routes(START_LAT, START_LON, END_LAT, END_LON)
+    if not routes:
+        raise SystemExit("ORS found no route for the configured start/end")
+    raw = build_graph_from_routes(routes)
+    path = os.path.join(out_dir, "raw.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(raw, f)
+    print(f"Raw graph ({len(raw)} nodes) saved to {path}")
+    return raw, (START_LAT, START_LON), (END_LAT, END_LON)
+
+
+def run_sweep(grid_path, out_dir, raw_path=None, jobs=None):
+    """Clean one raw graph with every parameter combination in the grid.
+
+    Writes sweep.csv to out_dir and prints the smallest output that is still
+    a single connected component.
+    """
+    combos = load_sweep_grid(grid_path)
+    os.makedirs(out_dir, exist_ok=True)
+    raw, start, end = sweep_raw_graph(raw_path, out_dir)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(combos)))
+
+    # Checkpoints would make clean_s depend on which combination ran first
+    settings = {
+        "EMBED_NAV_TABLE": EMBED_NAV_TABLE,
+        "EMBED_SNAP_INDEX": EMBED_SNAP_INDEX,
+        "STAGE_CACHE_ENABLED": False,
+        "CLEAN_JOBS": 1,
+    }
+
+    print(f"Sweep: {len(combos)} combinations over {len(raw)} raw nodes on {jobs} processes...")
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_sweep_worker_init,
+        initargs=(settings, raw, start, end),
+    ) as pool:
+        rows = list(pool.map(_run_sweep_combo, combos))
+    wall = time.perf_counter() - t0
+
+    swept = list(combos[0])
+    sweep_path = os.path.join(out_dir, "sweep.csv")
+    with open(sweep_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=swept + list(SWEEP_RESULT_FIELDS), extrasaction="ignore",
+        )
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                k: (f"{v:.3f}" if isinstance(v, float) and k == "clean_s" else v)
+                for k, v in row.items()
+            })
+
+    print_table(
+        rows,
+        swept + ["status", "nodes", "edges", "comps", "clean s", "bytes"],
+        swept + ["status", "clean_nodes", "clean_edges", "components", "clean_s", "json_bytes"],
+    )
+    print(f"{len(rows)} combinations in {wall:.1f} s ({sweep_path})")
+
+    connected = [r for r in rows if r["status"] == "ok" and r["components"] == 1]
+    if connected:
+        best = min(connected, key=lambda r: (r["json_bytes"], r["clean_s"]))
+        print("Smallest connected output: " + ", ".join(f"{k}={best[k]}" for k in swept))
+    else:
+        print("No combination produced a connected graph")
+    return rows
 
-    print(f"Writing {KML_PATH} ...")
-    kml_str = build_kml_from_json(json_nodes_clean)
-    with open(KML_PATH, "w", encoding="utf-8") as f:
-        f.write(kml_str)
+
+# =============== MAIN LOGIC ===============
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a cleaned walking route graph (JSON + KML) from ORS.",
+    )
+    parser.add_argument(
+        "--ors-url", default=ORS_BASE_URL,
+        help="ORS base URL, e.g. a local ors-standin.py (default: ORS_BASE_URL or the public API)",
+    )
+    parser.add_argument(
+        "--cache-dir", default=ORS_CACHE_DIR,
+        help=f"ORS response cache folder (default: {ORS_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--cache-ttl", type=float, default=ORS_CACHE_TTL_S,
+        help="seconds before a cached response is refetched",
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=float, default=ORS_CACHE_MAX_BYTES / (1024 * 1024),
+        help="cache size limit, least recently used entries are evicted beyond it",
+    )
+    parser.add_argument(
+        "--cache-only", action="store_true",
+        help="never call ORS; fail on any request that is not cached",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="bypass the response cache entirely",
+    )
+    parser.add_argument(
+        "--stage-cache-dir", default=STAGE_CACHE_DIR,
+        help=f"clean_graph stage checkpoint folder (default: {STAGE_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--stage-cache-max-mb", type=float, default=STAGE_CACHE_MAX_BYTES / (1024 * 1024),
+        help="checkpoint size limit, least recently used checkpoints are evicted beyond it",
+    )
+    parser.add_argument(
+        "--no-stage-cache", action="store_true",
+        help="rerun every clean_graph stage instead of resuming from checkpoints",
+    )
+    parser.add_argument(
+        "--local-network",
+        help="GeoJSON walking network that answers connector routes instead of ORS",
+    )
+    parser.add_argument(
+        "--local-base", action="store_true",
+        help="with --local-network, also route the base path locally (no alternatives)",
+    )
+    parser.add_argument(
+        "--clean-jobs", type=int, default=CLEAN_JOBS,
+        help="processes for tiled clean_graph passes, 1 = serial (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--clean-tile-m", type=float, default=CLEAN_TILE_M,
+        help="tile side in metres for --clean-jobs (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-connector-matrix", action="store_true",
+        help="pick connectors by straight-line distance instead of one ORS matrix request",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=ORS_MAX_WORKERS,
+        help=f"concurrent ORS requests for connectors (default: {ORS_MAX_WORKERS})",
+    )
+    parser.add_argument(
+        "--rpm", type=float, default=ORS_MAX_REQUESTS_PER_MIN,
+        help="max ORS requests per minute, 0 disables the limit "
+             f"(default: {ORS_MAX_REQUESTS_PER_MIN})",
+    )
+    parser.add_argument(
+        "--binary", action="store_true",
+        help="also write the compact binary CSR graph (route.bin)",
+    )
+    parser.add_argument(
+        "--no-nav-table", action="store_true",
+        help="leave next_hop, dist_to_dest_m and edge lengths/bearings out of route.json",
+    )
+    parser.add_argument(
+        "--no-snap-index", action="store_true",
+        help="leave the per-node snap grid cell out of route.json",
+    )
+    parser.add_argument(
+        "--kmz", action="store_true",
+        help="write compressed .kmz instead of .kml",
+    )
+    parser.add_argument(
+        "--kml-per-edge", action="store_true",
+        help="one KML LineString per edge instead of merged degree-2 chains",
+    )
+    parser.add_argument(
+        "--report",
+        help="write per-stage timings, peak memory and work counters as JSON here",
+    )
+    parser.add_argument(
+        "--report-no-memory", action="store_true",
+        help="skip tracemalloc in --report (it slows allocation-heavy stages)",
+    )
+    parser.add_argument(
+        "--profile",
+        help="also run under cProfile and dump pstats data to this file",
+    )
+    parser.add_argument(
+        "--extend",
+        help="add --add-routes polylines to this cleaned route.json instead of calling ORS",
+    )
+    parser.add_argument(
+        "--add-routes",
+        help="GeoJSON LineStrings (or a JSON list of [lon, lat] lists) for --extend",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="batch mode: CSV or JSON list of named start/end pairs to generate",
+    )
+    parser.add_argument(
+        "--sweep",
+        help="sweep mode: JSON object of clean_graph parameters to lists of values",
+    )
+    parser.add_argument(
+        "--sweep-raw",
+        help="sweep mode: raw graph JSON to clean (default: fetch the configured start/end)",
+    )
+    parser.add_argument(
+        "--out-dir", default="routes",
+        help="batch and sweep mode output folder (default: routes)",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None,
+        help="batch and sweep mode worker processes (default: CPU count)",
+    )
+    return parser.parse_args(argv)
+
+
+def apply_args(args):
+    global ORS_BASE_URL, ORS_CACHE_DIR, ORS_CACHE_TTL_S, ORS_CACHE_MAX_BYTES
+    global ORS_CACHE_ONLY, ORS_CACHE_ENABLED
+    global ORS_MAX_WORKERS, ORS_MAX_REQUESTS_PER_MIN
+    global KMZ_OUTPUT, KML_COALESCE_CHAINS, WRITE_GRAPH_BIN, EMBED_NAV_TABLE
+    global EMBED_SNAP_INDEX
+    global STAGE_CACHE_DIR, STAGE_CACHE_MAX_BYTES, STAGE_CACHE_ENABLED
+    global LOCAL_NETWORK_PATH, LOCAL_ROUTE_BASE, CONNECTOR_MATRIX
+    global CLEAN_JOBS, CLEAN_TILE_M
+
+    ORS_BASE_URL = args.ors_url.rstrip("/")
+    ORS_CACHE_DIR = args.cache_dir
+    ORS_CACHE_TTL_S = args.cache_ttl
+    ORS_CACHE_MAX_BYTES = int(args.cache_max_mb * 1024 * 1024)
+    ORS_CACHE_ONLY = args.cache_only
+    ORS_CACHE_ENABLED = not args.no_cache
+    ORS_MAX_WORKERS = max(1, args.workers)
+    ORS_MAX_REQUESTS_PER_MIN = args.rpm or None
+    KMZ_OUTPUT = args.kmz
+    WRITE_GRAPH_BIN = args.binary
+    EMBED_NAV_TABLE = not args.no_nav_table
+    EMBED_SNAP_INDEX = not args.no_snap_index
+    STAGE_CACHE_DIR = args.stage_cache_dir
+    STAGE_CACHE_MAX_BYTES = int(args.stage_cache_max_mb * 1024 * 1024)
+    STAGE_CACHE_ENABLED = not args.no_stage_cache
+    LOCAL_NETWORK_PATH = args.local_network or None
+    LOCAL_ROUTE_BASE = args.local_base
+    CONNECTOR_MATRIX = not args.no_connector_matrix
+    CLEAN_JOBS = max(1, args.clean_jobs)
+    CLEAN_TILE_M = args.clean_tile_m
+    KML_COALESCE_CHAINS = not args.kml_per_edge
+    if ORS_CACHE_ONLY and not ORS_CACHE_ENABLED:
+        raise SystemExit("--cache-only and --no-cache cannot be combined")
+    if LOCAL_ROUTE_BASE and not LOCAL_NETWORK_PATH:
+        raise SystemExit("--local-base needs --local-network")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    apply_args(args)
+
+    if args.manifest:
+        if args.report or args.profile:
+            raise SystemExit("--report and --profile apply to single-route runs only")
+        run_batch(args.manifest, args.out_dir, args.jobs)
+        return
+    if args.sweep:
+        if args.report or args.profile:
+            raise SystemExit("--report and --profile apply to single-route runs only")
+        run_sweep(args.sweep, args.out_dir, args.sweep_raw, args.jobs)
+        return
+    if bool(args.extend) != bool(args.add_routes):
+        raise SystemExit("--extend and --add-routes must be given together")
+
+    if args.report:
+        profiling_start(trace_memory=not args.report_no_memory)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+
+    t0 = time.perf_counter()
+    if args.extend:
+        result = extend_route(args.extend, args.add_routes)
+    else:
+        result = generate_route(START_LAT, START_LON, END_LAT, END_LON)
+    if result["nodes"] is not None:
+        write_outputs(result["nodes"], JSON_PATH, KML_PATH)
+    wall = time.perf_counter() - t0
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"cProfile stats written to {args.profile}, top functions:")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+    if args.report:
+        write_profiling_report(args.report, {
+            "route": {
+                "start": [START_LAT, START_LON],
+                "end": [END_LAT, END_LON],
+                "raw_nodes": result["raw_nodes"],
+                "clean_nodes": result["clean_nodes"],
+                "clean_edges": result["clean_edges"],
+            },
+            "params": default_params(),
+            "ors_cache": dict(ORS_CACHE_STATS),
+            "total_wall_s": wall,
+        })
+        profiling_stop()
+        print(f"Profiling report written to {args.report}")
+
+    if result["nodes"] is None:
+        return
+
+    if ORS_CACHE_ENABLED and not args.extend:
+        print(
+            f"ORS cache: {ORS_CACHE_STATS['hits']} hits, "
+            f"{ORS_CACHE_STATS['misses']} misses, "
+            f"{ORS_CACHE_STATS['evictions']} evictions"
+        )
+    if STAGE_CACHE_ENABLED:
+        print(
+            f"Stage cache: {STAGE_CACHE_STATS['hits']} hits, "
+            f"{STAGE_CACHE_STATS['misses']} misses, "
+            f"{STAGE_CACHE_STATS['evictions']} evictions"
+        )
 
     print("Done.")
 
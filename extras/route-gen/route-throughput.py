@@ -0,0 +1,231 @@
+import argparse
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Random start/end pairs are drawn around this point
+ORIGIN_LAT, ORIGIN_LON = 52.50500, 6.10700
+M_PER_DEG = 6371000.0 * math.pi / 180.0
+
+PERCENTILES = (50, 90, 99)
+TIMINGS = ("fetch_s", "clean_s", "total_s")
+
+
+# =============== LOADING SCRIPTS ===============
+
+def load_script(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============== WORKLOAD ===============
+
+def random_pairs(count, min_m, max_m, radius_m, seed):
+    """count (start_lat, start_lon, end_lat, end_lon) pairs min_m..max_m apart,
+    both ends within radius_m of the origin."""
+    rnd = random.Random(seed)
+    kx = M_PER_DEG * math.cos(math.radians(ORIGIN_LAT))
+    pairs = []
+    while len(pairs) < count:
+        r = radius_m * math.sqrt(rnd.random())
+        a = rnd.uniform(0, 2 * math.pi)
+        x0, y0 = r * math.cos(a), r * math.sin(a)
+        d = rnd.uniform(min_m, max_m)
+        b = rnd.uniform(0, 2 * math.pi)
+        x1, y1 = x0 + d * math.cos(b), y0 + d * math.sin(b)
+        if math.hypot(x1, y1) > radius_m:
+            continue
+        pairs.append((
+            ORIGIN_LAT + y0 / M_PER_DEG, ORIGIN_LON + x0 / kx,
+            ORIGIN_LAT + y1 / M_PER_DEG, ORIGIN_LON + x1 / kx,
+        ))
+    return pairs
+
+
+_RG = None
+_READY = None
+
+
+def _worker_init(route_gen_path, settings, ready):
+    global _RG, _READY
+    _RG = load_script("route_gen", route_gen_path)
+    for key, value in settings.items():
+        setattr(_RG, key, value)
+    _READY = ready
+
+
+def _wait_ready(_):
+    # Blocks until one of these runs on every worker, so each worker has
+    # been started and has loaded route-gen before timing begins
+    _READY.wait(timeout=120)
+
+
+def _run_pair(pair):
+    t0 = time.perf_counter()
+    row = {"status": "ok"}
+    try:
+        result = _RG.generate_route(*pair, log=lambda *args: None)
+        if result["nodes"] is None:
+            row["status"] = "no route"
+        for key in ("fetch_s", "clean_s", "clean_nodes"):
+            row[key] = result[key]
+    except (RuntimeError, ValueError, OSError) as e:
+        row["status"] = f"error: {e}"
+    row["total_s"] = time.perf_counter() - t0
+    return row
+
+
+# =============== REPORTING ===============
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(rows, wall):
+    ok = [r for r in rows if r["status"] == "ok"]
+    summary = {
+        "routes": len(rows),
+        "ok": len(ok),
+        "no_route": sum(1 for r in rows if r["status"] == "no route"),
+        "errors": sum(1 for r in rows if r["status"].startswith("error")),
+        "wall_s": wall,
+        "routes_per_s": len(ok) / wall if wall > 0 else None,
+    }
+    for key in TIMINGS:
+        values = [r[key] for r in ok if key in r]
+        summary[key] = {f"p{q}": percentile(values, q) for q in PERCENTILES}
+        summary[key]["max"] = max(values) if values else None
+    return summary
+
+
+def print_summary(summary):
+    print(
+        f"{summary['ok']}/{summary['routes']} routes ok "
+        f"({summary['no_route']} no route, {summary['errors']} errors) "
+        f"in {summary['wall_s']:.2f} s: {summary['routes_per_s'] or 0:.2f} routes/s"
+    )
+    print(f"    {'':10}" + "".join(f"{k:>10}" for k in [f"p{q}" for q in PERCENTILES] + ["max"]))
+    for key in TIMINGS:
+        cells = [summary[key][f"p{q}"] for q in PERCENTILES] + [summary[key]["max"]]
+        print(f"    {key:10}" + "".join(
+            f"{v * 1000:>8.1f}ms" if v is not None else f"{'-':>10}" for v in cells
+        ))
+
+
+# =============== MAIN LOGIC ===============
+
+def main(argv=None):
+    standin_mod = load_script("ors_standin", os.path.join(HERE, "ors-standin.py"))
+
+    parser = argparse.ArgumentParser(
+        description="Measure end-to-end fetch + clean throughput of route-gen.py "
+                    "against a local ORS stand-in.",
+    )
+    parser.add_argument("--routes", type=int, default=50, help="start/end pairs to run (default: 50)")
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="concurrent routes, one process each (default: 1)",
+    )
+    parser.add_argument(
+        "--min-m", type=float, default=300.0,
+        help="shortest straight start/end distance (default: 300)",
+    )
+    parser.add_argument(
+        "--max-m", type=float, default=1500.0,
+        help="longest straight start/end distance (default: 1500)",
+    )
+    parser.add_argument(
+        "--radius-m", type=float, default=3000.0,
+        help="area all start/end points lie in (default: 3000)",
+    )
+    parser.add_argument(
+        "--alt-routes", type=int, default=2,
+        help="alternative routes requested per pair (default: 2)",
+    )
+    parser.add_argument(
+        "--url",
+        help="ORS (or stand-in) base URL to use instead of starting a stand-in here",
+    )
+    parser.add_argument(
+        "--use-cache", action="store_true",
+        help="let route-gen use its ORS response cache (off by default so every request is served)",
+    )
+    parser.add_argument(
+        "--route-gen", default=os.path.join(HERE, "route-gen.py"),
+        help="route-gen.py to measure",
+    )
+    parser.add_argument(
+        "--out", default="throughput-results.json",
+        help="where to save the JSON results (default: throughput-results.json)",
+    )
+    standin_mod.add_standin_args(parser)
+    args = parser.parse_args(argv)
+
+    server = standin = None
+    url = args.url
+    if not url:
+        standin = standin_mod.standin_from_args(args)
+        server, url = standin_mod.start_server(standin)
+
+    settings = {
+        "ORS_BASE_URL": url.rstrip("/"),
+        "ORS_CACHE_ENABLED": args.use_cache,
+        "ORS_MAX_REQUESTS_PER_MIN": None,
+        "STAGE_CACHE_ENABLED": False,
+        "ALT_ROUTE_COUNT": args.alt_routes,
+    }
+    pairs = random_pairs(args.routes, args.min_m, args.max_m, args.radius_m, args.seed)
+    jobs = max(1, min(args.jobs, len(pairs)))
+
+    print(f"Running {len(pairs)} routes against {url} on {jobs} processes...")
+    ctx = multiprocessing.get_context()
+    ready = ctx.Barrier(jobs)
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=ctx,
+        initializer=_worker_init,
+        initargs=(args.route_gen, settings, ready),
+    ) as pool:
+        list(pool.map(_wait_ready, range(jobs)))
+        t0 = time.perf_counter()
+        rows = list(pool.map(_run_pair, pairs))
+        wall = time.perf_counter() - t0
+
+    summary = summarize(rows, wall)
+    print_summary(summary)
+    if standin is not None:
+        print(f"Stand-in: {json.dumps(standin.stats)}")
+        server.shutdown()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "url": url,
+            "args": vars(args),
+            "summary": summary,
+            "standin": standin.stats if standin is not None else None,
+            "runs": rows,
+        }, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROUTE_GEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "route-gen.py")
+
+
+@pytest.fixture(scope="session")
+def rg():
+    """route-gen.py loaded as a module (its file name is not importable)."""
+    spec = importlib.util.spec_from_file_location("route_gen", ROUTE_GEN)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["route_gen"] = module
+    spec.loader.exec_module(module)
+    return module
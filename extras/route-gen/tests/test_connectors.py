@@ -0,0 +1,42 @@
+import math
+
+LAT0, LON0 = 52.5, 6.1
+
+
+def route(rg, offset_m, length_m=600.0, step_m=10.0):
+    """Straight east-west (lon, lat) route offset_m north of LAT0, sharing
+    its ends with the main route."""
+    kx = rg.M_PER_DEG * math.cos(math.radians(LAT0))
+    count = int(length_m / step_m) + 1
+    points = []
+    for k in range(count):
+        x = k * step_m
+        y = offset_m * math.sin(math.pi * k / (count - 1))
+        points.append([LON0 + x / kx, LAT0 + y / rg.M_PER_DEG])
+    return points
+
+
+def test_matrix_failure_falls_back_to_nearest(rg, monkeypatch):
+    base = [route(rg, 0.0), route(rg, 80.0)]
+
+    def matrix_down(*args):
+        raise RuntimeError("ORS error 503: quota exceeded")
+
+    def straight_connectors(queries, max_workers=None):
+        return [[[[q[0], q[1]], [q[2], q[3]]]] for q in queries]
+
+    monkeypatch.setattr(rg, "LOCAL_NETWORK_PATH", None)
+    monkeypatch.setattr(rg, "CONNECTOR_MATRIX", True)
+    monkeypatch.setattr(rg, "ors_route_iter", lambda *args, **kwargs: iter(base))
+    monkeypatch.setattr(rg, "ors_matrix", matrix_down)
+    monkeypatch.setattr(rg, "ors_route_many", straight_connectors)
+
+    logged = []
+    routes = rg.fetch_routes(
+        LAT0, LON0, base[0][-1][1], base[0][-1][0],
+        {"alt_route_count": 1, "connectors_per_alt": 3},
+        log=lambda *args: logged.append(" ".join(map(str, args))),
+    )
+
+    assert len(routes) > 2   # both base routes plus connectors
+    assert any("Connector matrix ORS error" in line and "quota" in line for line in logged)
@@ -0,0 +1,37 @@
+import math
+
+LAT0, LON0 = 52.5, 6.1
+
+
+def lonlat(rg, x, y):
+    """(lon, lat) of a point x/y metres east/north of LAT0, LON0."""
+    kx = rg.M_PER_DEG * math.cos(math.radians(LAT0))
+    return (LON0 + x / kx, LAT0 + y / rg.M_PER_DEG)
+
+
+def edge_set(nodes):
+    pos = {n["id"]: (n["lat"], n["lon"]) for n in nodes}
+    return {frozenset((pos[n["id"]], pos[m])) for n in nodes for m in n["connected_to"]}
+
+
+def test_long_new_edge_splits_at_existing_node(rg):
+    # A cleaned path ending 5 m below the middle of a new 200 m segment,
+    # which is far longer than the re-clean reach around its ends
+    path = [lonlat(rg, 100, -60), lonlat(rg, 100, -30), lonlat(rg, 100, -5)]
+    base = rg.clean_graph(rg.build_graph_from_routes([path]))
+    new = [lonlat(rg, 0, 0), lonlat(rg, 200, 0)]
+
+    extended = rg.extend_graph(base, [new])
+    full = rg.clean_graph(rg.build_graph_from_routes([path, new]))
+
+    assert rg.count_components(full) == 1
+    assert rg.count_components(extended) == 1
+    assert len(extended) == len(full)
+
+    # The path's end is joined to both ends of the new segment, exactly as
+    # a full re-clean does it
+    lon, lat = lonlat(rg, 100, -5)
+    end = min(extended, key=lambda n: abs(n["lat"] - lat) + abs(n["lon"] - lon))
+    ends = {extended[v - 1]["lon"] for v in end["connected_to"]}
+    assert {round(x, 6) for x in (lonlat(rg, 0, 0)[0], lonlat(rg, 200, 0)[0])} <= ends
+    assert edge_set(extended) == edge_set(full)
@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "route.json")
+
+SMALL = [
+    {"id": 1, "lat": 52.5050012, "lon": 6.1070049, "connected_to": [2]},
+    {"id": 2, "lat": -33.86785, "lon": 151.2073251, "connected_to": [1, 3]},
+    {"id": 3, "lat": 0.0, "lon": -179.99999995, "connected_to": [2]},
+    {"id": 4, "lat": 89.9999999, "lon": 0.00000004, "connected_to": []},
+]
+
+
+def example_nodes():
+    with open(EXAMPLE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("nodes", [SMALL, example_nodes(), []], ids=["small", "example", "empty"])
+def test_round_trip(rg, tmp_path, nodes):
+    path = str(tmp_path / "route.bin")
+    rg.write_graph_bin(nodes, path)
+    back = rg.read_graph_bin(path)
+
+    half_unit = 0.5 / rg.GRAPH_BIN_SCALE + 1e-12
+    assert [n["id"] for n in back] == [n["id"] for n in nodes]
+    assert [n["connected_to"] for n in back] == [list(n["connected_to"]) for n in nodes]
+    for a, b in zip(nodes, back):
+        assert abs(a["lat"] - b["lat"]) <= half_unit
+        assert abs(a["lon"] - b["lon"]) <= half_unit
+
+
+def test_load_gives_flat_csr(rg, tmp_path):
+    path = str(tmp_path / "route.bin")
+    rg.write_graph_bin(SMALL, path)
+    g = rg.load_graph_bin(path)
+    assert g["scale"] == rg.GRAPH_BIN_SCALE
+    assert list(g["offsets"]) == [0, 1, 3, 4, 4]
+    assert list(g["indices"]) == [1, 0, 2, 1]
+    assert list(g["lat"]) == [round(n["lat"] * rg.GRAPH_BIN_SCALE) for n in SMALL]
+
+
+def test_verify_reports_error_within_half_unit(rg, tmp_path):
+    path = str(tmp_path / "route.bin")
+    rg.write_graph_bin(SMALL, path)
+    assert rg.verify_graph_bin(SMALL, path) <= 0.5 / rg.GRAPH_BIN_SCALE + 1e-12
+
+
+def corrupt(rg, tmp_path, edit):
+    path = tmp_path / "route.bin"
+    rg.write_graph_bin(SMALL, str(path))
+    path.write_bytes(edit(path.read_bytes()))
+    return str(path)
+
+
+@pytest.mark.parametrize("edit, message", [
+    (lambda data: b"XXXX" + data[4:], "not a binary route graph"),
+    (lambda data: data[:4] + (2).to_bytes(2, "little") + data[6:], "unsupported graph format version 2"),
+    (lambda data: data[:-4], "expected"),
+    (lambda data: data + b"\0\0\0\0", "expected"),
+    (lambda data: data[:10], "too short"),
+])
+def test_rejects_bad_files(rg, tmp_path, edit, message):
+    path = corrupt(rg, tmp_path, edit)
+    with pytest.raises(ValueError, match=message):
+        rg.read_graph_bin(path)
+
+
+@pytest.mark.parametrize("nodes", [
+    [{"id": 2, "lat": 0.0, "lon": 0.0, "connected_to": []}],
+    [{"id": 1, "lat": 0.0, "lon": 0.0, "connected_to": [5]}],
+])
+def test_write_rejects_bad_ids(rg, tmp_path, nodes):
+    with pytest.raises(ValueError):
+        rg.write_graph_bin(nodes, str(tmp_path / "route.bin"))
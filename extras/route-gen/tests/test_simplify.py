@@ -0,0 +1,49 @@
+import math
+import random
+
+import pytest
+
+
+def arc(rg, radius_m, step_m, count, lat0=52.5, lon0=6.1):
+    """(lon, lat) points every step_m along a circle of radius_m."""
+    kx = rg.M_PER_DEG * math.cos(math.radians(lat0))
+    points = []
+    for k in range(count):
+        a = k * step_m / radius_m
+        points.append((lon0 + radius_m * math.sin(a) / kx,
+                       lat0 + radius_m * (1 - math.cos(a)) / rg.M_PER_DEG))
+    return points
+
+
+def max_deviation(rg, coords, simplified):
+    proj = rg.LocalProjection(coords[0][1], coords[0][0])
+    xs, ys = proj.forward([c[1] for c in coords], [c[0] for c in coords])
+    at = {c: k for k, c in enumerate(coords)}
+    kept = [at[c] for c in simplified]
+    worst = 0.0
+    for i, j in zip(kept, kept[1:]):
+        if j - i >= 2:
+            worst = max(worst, rg._segment_deviation(list(xs), list(ys), i, j)[0])
+    return worst
+
+
+@pytest.mark.parametrize("radius_m", [200.0, 500.0, 2000.0])
+def test_gentle_curve_keeps_only_spacing_points(rg, radius_m):
+    coords = arc(rg, radius_m, 5.0, 800)
+    simplified = rg.simplify_route(coords, 5.0, 60.0)
+    # One waypoint per 60 m of path is all the spacing rule needs
+    assert len(simplified) <= math.ceil(800 * 5.0 / 60.0) + 2
+    assert max_deviation(rg, coords, simplified) <= 5.0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_tolerance_and_spacing_hold(rg, seed):
+    rnd = random.Random(seed)
+    coords, lon, lat = [], 6.1, 52.5
+    for _ in range(400):
+        lon += rnd.uniform(-2, 4) / 68000
+        lat += rnd.uniform(-2, 4) / 111000
+        coords.append((lon, lat))
+    simplified = rg.simplify_route(coords, 5.0, 60.0)
+    assert simplified[0] == coords[0] and simplified[-1] == coords[-1]
+    assert max_deviation(rg, coords, simplified) <= 5.0 + 1e-9
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+FEATURES = [
+    {
+        "type": "Feature",
+        # The member name also appears inside a value; it must not match
+        "properties": {"name": "Straße \"features\": [", "features": [9]},
+        "geometry": {"type": "LineString", "coordinates": [[6.1, 52.5], [6.101, 52.501]]},
+    },
+    {
+        "type": "Feature",
+        "properties": {},
+        "geometry": {
+            "type": "MultiLineString",
+            "coordinates": [[[6.102, 52.5], [6.103, 52.5, 4.0]], [[6.2, 52.6], [6.21, 52.61]]],
+        },
+    },
+]
+
+COLLECTION = json.dumps(
+    {"type": "FeatureCollection", "bbox": [6.1, 52.5, 6.21, 52.61], "features": FEATURES},
+    indent=2,
+    ensure_ascii=False,
+).replace('"features":', '"features"' + " " * 30 + ":")
+
+
+def split(text, *offsets):
+    bounds = [0, *offsets, len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("offset", range(len(COLLECTION) + 1))
+def test_features_survive_any_split(rg, offset):
+    assert list(rg.iter_geojson_features(split(COLLECTION, offset))) == FEATURES
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 20, 45, 4096])
+def test_features_from_small_byte_chunks(rg, size):
+    data = COLLECTION.encode("utf-8")
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+    assert list(rg.iter_geojson_features(chunks)) == FEATURES
+
+
+def test_features_nested_in_cache_entry(rg):
+    entry = json.dumps({"created": 1.0, "url": "u", "body": {}, "response": json.loads(COLLECTION)})
+    for offset in range(0, len(entry), 7):
+        features = rg.iter_geojson_features(split(entry, offset), ("response", "features"))
+        assert list(features) == FEATURES
+
+
+@pytest.mark.parametrize("doc, expected", [
+    ({"type": "FeatureCollection", "features": None}, []),
+    ({"type": "Feature", "geometry": FEATURES[0]["geometry"]},
+     [{"type": "Feature", "geometry": FEATURES[0]["geometry"]}]),
+    (FEATURES[0]["geometry"], [{"type": "Feature", "geometry": FEATURES[0]["geometry"]}]),
+])
+def test_documents_without_a_features_array(rg, doc, expected):
+    assert list(rg.iter_geojson_features([json.dumps(doc, indent=2)])) == expected
+
+
+def test_truncated_collection_raises(rg):
+    with pytest.raises(ValueError):
+        list(rg.iter_geojson_features([COLLECTION[:len(COLLECTION) // 2]]))
+
+
+def test_load_polylines(rg, tmp_path):
+    path = tmp_path / "routes.geojson"
+    path.write_text(COLLECTION, encoding="utf-8")
+    assert list(rg.load_polylines(str(path))) == [
+        [(6.1, 52.5), (6.101, 52.501)],
+        [(6.102, 52.5), (6.103, 52.5)],
+        [(6.2, 52.6), (6.21, 52.61)],
+    ]
+
+    path.write_text(json.dumps([[[6.1, 52.5], [6.2, 52.6]]], indent=2), encoding="utf-8")
+    assert list(rg.load_polylines(str(path))) == [[(6.1, 52.5), (6.2, 52.6)]]
@@ -9,6 +9,12 @@ const getNextPoint = (nodes, currentId, prevId = null) => {
         return null;
     }
 
+    // Graphs from route-gen.py carry a shortest-path next hop per node (ids run 1..N)
+    const indexed = nodes[currentId - 1];
+    if(indexed?.id === currentId && indexed.next_hop != null){
+        return indexed.next_hop;
+    }
+
     const nodeById = new Map(nodes.map(n => [n.id, n]));
 
     const current = nodeById.get(currentId);
@@ -1,3 +1,5 @@
+import nearbyNodes from "./snapIndex";
+
 const toRad = (x) => (x * Math.PI) / 180;
 
 const haversine = (lat1, lon1, lat2, lon2) => {
@@ -26,7 +28,8 @@ const isOffCourse = (nodes, expectedId, coords, headingDeg, thresholdMeters = 15
         return { offCourse: false, snappedNode: null };
     }
 
-    const expected = nodes.find((n) => n.id === expectedId);
+    const indexed = nodes[expectedId - 1];
+    const expected = indexed?.id === expectedId ? indexed : nodes.find((n) => n.id === expectedId);
     if(!expected){
         return { offCourse: false, snappedNode: null };
     }
@@ -42,7 +45,8 @@ const isOffCourse = (nodes, expectedId, coords, headingDeg, thresholdMeters = 15
     let bestNode = null;
     let bestDist = Infinity;
 
-    for(const n of nodes){
+    // Only nodes within thresholdMeters can make us off course
+    for(const n of nearbyNodes(nodes, latitude, longitude, thresholdMeters)){
         if(n.id === expectedId || (lastVisitedId != null && n.id === lastVisitedId)){
             continue;
         }
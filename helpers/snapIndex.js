@@ -0,0 +1,55 @@
+// Same grid as SNAP INDEX in extras/route-gen/route-gen.py
+const CELL_DEG_LAT = 0.001;
+const CELL_DEG_LON = 0.0015;
+const M_PER_DEG = (6371000 * Math.PI) / 180;
+
+const indexCache = new WeakMap();
+
+const getSnapIndex = (nodes) => {
+    if(!nodes?.length || !Array.isArray(nodes[0].cell)){
+        return null;
+    }
+
+    let index = indexCache.get(nodes);
+    if(!index){
+        index = new Map();
+        for(const n of nodes){
+            const key = `${n.cell[0]}:${n.cell[1]}`;
+            const bucket = index.get(key);
+            if(bucket){
+                bucket.push(n);
+            }
+            else{
+                index.set(key, [n]);
+            }
+        }
+        indexCache.set(nodes, index);
+    }
+    return index;
+};
+
+// Nodes that could be within radiusMeters of the point; all nodes if the graph has no cells
+const nearbyNodes = (nodes, lat, lon, radiusMeters) => {
+    const index = getSnapIndex(nodes);
+    if(!index){
+        return nodes || [];
+    }
+
+    const cellSideM = Math.min(CELL_DEG_LAT, CELL_DEG_LON * Math.cos((lat * Math.PI) / 180)) * M_PER_DEG;
+    const reach = Math.max(1, Math.ceil(radiusMeters / cellSideM));
+    const row = Math.floor(lat / CELL_DEG_LAT);
+    const col = Math.floor(lon / CELL_DEG_LON);
+
+    const out = [];
+    for(let r = row - reach; r <= row + reach; r++){
+        for(let c = col - reach; c <= col + reach; c++){
+            const bucket = index.get(`${r}:${c}`);
+            if(bucket){
+                out.push(...bucket);
+            }
+        }
+    }
+    return out;
+};
+
+export default nearbyNodes;